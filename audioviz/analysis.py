@@ -0,0 +1,127 @@
+"""Analysis pipeline state independent of audio source
+"""
+
+
+import ctypes
+
+import numpy as np
+
+from .beat import BeatDetector
+from .filter import (
+    calc_band_gains, calc_bin_weights, calc_gain_layout, calc_threads, filter_signal, get_rfft,
+    shift_frame
+)
+from .jit import set_threads
+from .plan import load_band_plan
+
+
+def calc_hops_per_analysis(hop_rate: float, fps: int, analysis_rate: float | None) -> int:
+    """Number of hops between analyses, so that spectra are computed at least
+    `analysis_rate` times per drawn frame.
+    """
+    if analysis_rate is None:
+        return 1
+
+    return max(int(hop_rate / (fps * analysis_rate)), 1)
+
+
+class Analyzer:
+    """Precalculations and buffers for turning captured buffers into band magnitudes.
+    """
+
+    def __init__(self, config: dict):
+        self.sample_frequency = config['frequency']
+
+        # signal processing
+        frame_size = config['frame_size']
+        self.buffer_size = config['buffer_size']
+        self.scale = config['scale']
+        self.db_range = config['db_range']
+        self.rfft = get_rfft(config['fft_engine'])
+        # single precision halves memory traffic of all the largest arrays
+        self.dtype = np.float32 if config['precision'] == 'single' else np.float64
+
+        # precalculations, band layout and window are cached
+        self.overlap = frame_size - self.buffer_size
+        self.bands_distr = config['bands_distr']
+        plan = load_band_plan(
+            config['bands_distr'], self.sample_frequency, frame_size,
+            config['lower_freq'], config['upper_freq'], config['window_type']
+        )
+        self.window = plan['window'].astype(self.dtype)
+        self.fft_lower_bounds = plan['fft_lower_bounds']
+        self.fft_upper_bounds = plan['fft_upper_bounds']
+        self.bars = plan['bars']
+
+        fft_freqs = np.fft.rfftfreq(frame_size, 1.0 / self.sample_frequency)
+        fft_size = fft_freqs.size
+
+        self.adjustment = np.ones(self.bars, dtype=self.dtype)
+        self.noise_reduction = config['noise_reduction']
+
+        # analyse only as often as frames are drawn
+        self.hops = 0
+        self.hops_per_analysis = calc_hops_per_analysis(
+            self.sample_frequency / self.buffer_size,
+            max(window['fps'] for window in config['windows']), config['analysis_rate']
+        )
+        self.gains = calc_band_gains(
+            self.fft_lower_bounds, self.fft_upper_bounds, self.bars,
+            calc_bin_weights(fft_freqs, config['weighting_type']), plan['amplifier'],
+            np.sum(self.window.astype(np.float64) ** 2), self.scale
+        ).astype(self.dtype)
+        self.gain_bins, self.gain_offsets = calc_gain_layout(
+            self.fft_lower_bounds, self.fft_upper_bounds, self.bars)
+
+        # many bands are split between threads
+        self.threads = calc_threads(config['threads'], self.bars)
+
+        # create buffers
+        self.frame = np.zeros(frame_size, dtype='f')
+        self.fft_mags = np.zeros(fft_size, dtype=self.dtype)
+        self.prev_mags = np.zeros(self.bars, dtype=self.dtype)
+        self.band_mags = np.ones(self.bars, dtype=self.dtype)
+
+        # beats reuse spectrum of bars
+        self.hop_period = self.buffer_size / self.sample_frequency
+        self.beats = None
+        self.beat = False
+        if config['beats']:
+            # logspace bounds have an extra entry past the last band
+            self.beats = BeatDetector(self.fft_lower_bounds[:self.bars],
+                                      self.fft_upper_bounds[:self.bars],
+                                      self.hop_period * self.hops_per_analysis)
+
+    def process(self, buffer: ctypes.Array | np.ndarray) -> bool:
+        """Consumes one captured buffer, returns whether band magnitudes were updated.
+        """
+        self.hops += 1
+        if self.hops < self.hops_per_analysis:
+            # nobody will see the frame, only accumulate samples
+            shift_frame(self.frame, buffer, self.overlap, self.buffer_size)
+            return False
+
+        if self.threads > 1:
+            # number of threads is a setting of the calling thread
+            set_threads(self.threads)
+        filter_signal(self.fft_mags, self.frame, buffer, self.overlap,
+                      self.buffer_size, self.window, self.bars,
+                      self.gain_bins, self.gain_offsets, self.gains, self.adjustment,
+                      self.band_mags, self.prev_mags, self.noise_reduction,
+                      self.scale, self.db_range, self.hops, self.rfft, self.threads > 1)
+        if self.beats is not None:
+            self.beat = self.beats.process(self.fft_mags, self.hops * self.hop_period)
+        self.hops = 0
+        return True
+
+    def skip(self, buffer: ctypes.Array | np.ndarray):
+        """Accumulates buffer without analysis, the next analysis accounts its hop.
+        """
+        self.hops += 1
+        shift_frame(self.frame, buffer, self.overlap, self.buffer_size)
+
+    def warm_up(self, buffer: ctypes.Array | np.ndarray):
+        """Runs the whole pipeline once to compile jit kernels.
+        """
+        self.hops = self.hops_per_analysis - 1
+        self.process(buffer)
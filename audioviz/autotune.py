@@ -0,0 +1,120 @@
+"""Selection of analysis parameters by benchmarking the pipeline on synthetic audio
+"""
+
+
+import json
+import os
+import platform
+import time
+
+import numpy as np
+
+from .analysis import Analyzer
+from .filter import available_fft_engines
+
+
+FRAME_SIZES = [2048, 4096, 8192, 16384]
+BUFFER_SIZES = [256, 512, 1024, 2048]
+
+
+def synthesize(frequency: int, samples: int, seed: int = 0) -> np.ndarray:
+    """Generates music-like signal: a few drifting tones with beats over noise.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(samples) / frequency
+
+    signal = 0.05 * rng.standard_normal(samples)
+    for tone in rng.uniform(40, 8000, 6):
+        drift = 1 + 0.02 * np.sin(2 * np.pi * 0.1 * t)
+        signal += 0.1 * np.sin(2 * np.pi * tone * drift * t)
+    signal *= 1 + 0.5 * (np.sin(2 * np.pi * 2 * t) > 0)
+
+    return (signal / np.abs(signal).max()).astype('f')
+
+
+def calc_latency(frame_size: int, buffer_size: int, frequency: int) -> float:
+    """Latency in ms: one buffer to capture plus delay to the window centre.
+    """
+    return (buffer_size + frame_size / 2) / frequency * 1000
+
+
+def split_buffers(audio: np.ndarray, buffer_size: int) -> np.ndarray:
+    """Whole buffers of `audio`, the incomplete last one is dropped.
+    """
+    return audio[:audio.size // buffer_size * buffer_size].reshape(-1, buffer_size)
+
+
+def measure_load(config: dict, audio: np.ndarray) -> float:
+    """Returns CPU time spent on analysis as a fraction of the analysed audio duration.
+    """
+    analyzer = Analyzer(config)
+    buffers = split_buffers(audio, analyzer.buffer_size)
+
+    analyzer.warm_up(buffers[0])
+
+    start = time.thread_time()
+    for buffer in buffers:
+        analyzer.process(buffer)
+    elapsed = time.thread_time() - start
+
+    return elapsed / (buffers.size / config['frequency'])
+
+
+def autotune(config: dict, target_latency: float = 120., cpu_budget: float = 0.05,
+             max_resolution: float = 12., seconds: float = 5.) -> dict:
+    """Benchmarks frame sizes, buffer sizes and fft engines, returns the cheapest
+    configuration that meets target latency (ms), CPU budget (fraction of one core)
+    and frequency resolution (Hz).
+    """
+    frequency = config['frequency']
+    fps = max(window['fps'] for window in config['windows'])
+    audio = synthesize(frequency, int(seconds * frequency))
+
+    print('{:>8} {:>6} {:>7} {:>12} {:>14} {:>8}'.format(
+        'engine', 'frame', 'buffer', 'latency, ms', 'resolution, Hz', 'cpu, %'))
+    results = []
+    for engine in available_fft_engines():
+        for frame_size in FRAME_SIZES:
+            for buffer_size in BUFFER_SIZES:
+                latency = calc_latency(frame_size, buffer_size, frequency)
+                resolution = frequency / frame_size
+                # every drawn frame should get fresh samples
+                if (buffer_size >= frame_size or latency > target_latency
+                        or resolution > max_resolution or frequency / buffer_size < fps):
+                    continue
+
+                candidate = dict(config, frame_size=frame_size, buffer_size=buffer_size,
+                                 fft_engine=engine)
+                try:
+                    load = measure_load(candidate, audio)
+                except ValueError:
+                    # frame is too small to fit configured bars
+                    continue
+                print('{:>8} {:>6} {:>7} {:>12.1f} {:>14.2f} {:>8.2f}'.format(
+                    engine, frame_size, buffer_size, latency, resolution, load * 100))
+                results.append({
+                    'fft_engine': engine,
+                    'frame_size': frame_size,
+                    'buffer_size': buffer_size,
+                    'latency': latency,
+                    'cpu_load': load,
+                })
+
+    if not results:
+        raise ValueError('No configuration meets target latency and resolution.')
+
+    feasible = [result for result in results if result['cpu_load'] <= cpu_budget]
+    if not feasible:
+        print('No configuration fits CPU budget, choosing the cheapest one.')
+        feasible = results
+
+    profile = min(feasible, key=lambda result: result['cpu_load'])
+    profile.update(host=platform.node(), created=time.time(), frequency=frequency)
+
+    return profile
+
+
+def save_profile(profile: dict, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(profile, file, indent=4)
@@ -0,0 +1,111 @@
+"""Onset (beat) detection and tempo estimation from spectrum already computed for bars
+"""
+
+
+import numpy as np
+
+from .jit import jit_engine
+
+
+if jit_engine() == 'numba':
+    from numba import njit
+
+
+# onset is a spectral flux exceeding mean of recent ones by that many deviations
+THRESHOLD = 1.5
+HISTORY_SECONDS = 1.5
+# the fastest tempo is 240 bpm
+MIN_INTERVAL = 0.25
+MAX_INTERVAL = 2.0
+INTERVALS = 16
+
+
+def _detect_onset(fft_mags, fft_lower_bounds, fft_upper_bounds, prev_mags, history, position,
+                  threshold=THRESHOLD):
+    # spectral flux: rise of log-compressed magnitudes summed over bars bands,
+    # so logarithm is taken once per band instead of once per bin
+    flux = 0.0
+    for n in range(prev_mags.size):
+        energy = 0.0
+        for i in range(fft_lower_bounds[n], fft_upper_bounds[n] + 1):
+            energy += fft_mags[i]
+        mag = np.log1p(energy / (fft_upper_bounds[n] - fft_lower_bounds[n] + 1))
+        if mag > prev_mags[n]:
+            flux += mag - prev_mags[n]
+        prev_mags[n] = mag
+    flux /= prev_mags.size
+
+    # adaptive threshold follows loudness of music
+    mean = history.mean()
+    deviation = history.std()
+    history[position % history.size] = flux
+
+    return flux, flux > mean + threshold * deviation and flux > 0
+
+
+def _detect_onset_numpy(fft_mags, fft_lower_bounds, fft_upper_bounds, prev_mags, history,
+                        position, threshold=THRESHOLD):
+    bars = prev_mags.size
+    # band sums as differences of cumulative sum, bands might overlap
+    sums = np.concatenate(([0.], np.cumsum(fft_mags, dtype=np.float64)))
+    energy = sums[fft_upper_bounds[:bars] + 1] - sums[fft_lower_bounds[:bars]]
+    mags = np.log1p(energy / (fft_upper_bounds[:bars] - fft_lower_bounds[:bars] + 1))
+    flux = np.maximum(mags - prev_mags, 0).sum() / bars
+    prev_mags[:] = mags
+
+    mean = history.mean()
+    deviation = history.std()
+    history[position % history.size] = flux
+
+    return flux, bool(flux > mean + threshold * deviation and flux > 0)
+
+
+detect_onset = njit(_detect_onset) if jit_engine() == 'numba' else _detect_onset_numpy
+
+
+class BeatDetector:
+    """Incremental spectral flux onset detector with tempo estimation.
+
+    Times are counted in captured audio, so results do not depend on how fast
+    the analysis runs.
+    """
+
+    def __init__(self, fft_lower_bounds: np.ndarray, fft_upper_bounds: np.ndarray,
+                 analysis_period: float):
+        self.fft_lower_bounds = fft_lower_bounds
+        self.fft_upper_bounds = fft_upper_bounds
+        self.prev_mags = np.zeros(fft_lower_bounds.size)
+        self.history = np.zeros(max(int(HISTORY_SECONDS / analysis_period), 8))
+        self.position = 0
+
+        self.time = 0.
+        self.flux = 0.
+        self.last_beat = -MAX_INTERVAL
+        self.intervals = np.zeros(INTERVALS)
+        self.intervals_count = 0
+        self.tempo = 0.
+
+    def process(self, fft_mags: np.ndarray, elapsed: float) -> bool:
+        """Consumes spectrum analysed `elapsed` seconds after the previous one,
+        returns whether it starts a beat.
+        """
+        self.time += elapsed
+        self.flux, onset = detect_onset(fft_mags, self.fft_lower_bounds, self.fft_upper_bounds,
+                                        self.prev_mags, self.history, self.position)
+        self.position += 1
+        # history is not filled yet
+        if not onset or self.position < self.history.size:
+            return False
+
+        interval = self.time - self.last_beat
+        if interval < MIN_INTERVAL:
+            return False
+        self.last_beat = self.time
+
+        if interval <= MAX_INTERVAL:
+            self.intervals[self.intervals_count % INTERVALS] = interval
+            self.intervals_count += 1
+            intervals = self.intervals[:min(self.intervals_count, INTERVALS)]
+            self.tempo = 60 / np.median(intervals)
+
+        return True
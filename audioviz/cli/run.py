@@ -1,13 +1,14 @@
 import argparse
+import contextlib
 import os
+import sys
 from importlib import resources
 
-from audioviz.render import Renderer
-
 from ..config import parse_config
+from ..jit import select_jit
 
 
-def parse() -> str:
+def parse() -> tuple[str, argparse.Namespace]:
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--config', type=str, required=False,
                         help='Path to configuration file. Default is in package data.')
@@ -15,6 +16,18 @@ def parse() -> str:
                         help='List available devices and sources to listen to.')
     parser.add_argument('-d', '--default', action='store_true',
                         help='Show location of the default configuration file.')
+    parser.add_argument('-o', '--output', type=str, required=False,
+                        help='Render offscreen and write raw RGBA frames to file '
+                             '(use - for stdout) instead of showing a window.')
+    parser.add_argument('--replay', type=str, required=False,
+                        help='Replay band history recorded to file instead of capturing audio.')
+    parser.add_argument('--autotune', action='store_true',
+                        help='Benchmark analysis parameters on this machine '
+                             'and save the best ones to profile.')
+    parser.add_argument('--target-latency', type=float, default=120.,
+                        help='Maximal latency (ms) allowed for autotuning. Default is 120.')
+    parser.add_argument('--cpu-budget', type=float, default=5.,
+                        help='CPU usage (%% of one core) allowed for autotuning. Default is 5.')
     args = parser.parse_args()
 
     # default config
@@ -25,7 +38,7 @@ def parse() -> str:
         else:
             config_path = args.config
 
-    return config_path, args.sources, args.default
+    return config_path, args
 
 
 def list_sources():
@@ -37,14 +50,54 @@ def list_sources():
     return devices, apps
 
 
+def render_offscreen(config: dict, output_path: str):
+    from audioviz.offscreen import OffscreenRenderer
+    from audioviz.record import create_recorder
+
+    with contextlib.ExitStack() as stack:
+        if output_path == '-':
+            output = sys.stdout.buffer
+            # keep frames stream clean from messages
+            stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        else:
+            output = stack.enter_context(open(output_path, 'wb'))
+
+        if config['replay'] is not None:
+            from audioviz.history import HistoryReader
+            reader = HistoryReader(config['replay'])
+            r = OffscreenRenderer(config, reader.bars, output)
+            r.replay(reader)
+        else:
+            recorder = create_recorder(config)
+            r = OffscreenRenderer(config, recorder.num_bands(), output)
+            r.start(recorder)
+        print('Frames written: {}'.format(r.frames))
+
+
+def run_autotune(config: dict, target_latency: float, cpu_budget: float):
+    from audioviz.autotune import autotune, save_profile
+    from audioviz.config import default_profile_path
+
+    profile = autotune(config, target_latency, cpu_budget / 100)
+    print('Chosen: frame size {}, buffer size {}, fft engine {}'.format(
+        profile['frame_size'], profile['buffer_size'], profile['fft_engine']))
+
+    path = config['profile']
+    if path is None:
+        path = default_profile_path()
+        print('Profile is disabled in configuration, set `profile` to use it.')
+    save_profile(profile, path)
+    print('Profile saved to {}'.format(path))
+
+
 def run():
-    config_path, show_sources, show_config_location = parse()
+    config_path, args = parse()
 
-    if show_config_location:
+    if args.default:
         print('Configuration file in use: {}'.format(config_path))
         return
 
-    if show_sources:
+    if args.sources:
         devices, apps = list_sources()
         print('Available devices:')
         for device in devices:
@@ -55,5 +108,19 @@ def run():
         return
 
     config = parse_config(config_path)
-    r = Renderer(config)
+    config['replay'] = args.replay
+    # before any kernels are imported
+    select_jit(config['jit'])
+    if args.autotune:
+        run_autotune(config, args.target_latency, args.cpu_budget)
+        return
+
+    if args.output:
+        render_offscreen(config, args.output)
+        return
+
+    # GTK, cairo and numba are imported only when there is something to render
+    from audioviz.render import Visualizer
+
+    r = Visualizer(config)
     r.start()
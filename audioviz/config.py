@@ -2,6 +2,9 @@
 """
 
 
+import json
+import os
+import shutil
 from configparser import ConfigParser
 from difflib import get_close_matches
 
@@ -19,9 +22,13 @@ def parse_config(config_path: str) -> dict[str, bool | int | str | tuple | list]
     if config['size'] == 'screensize' and config['position'] != (0, 0):
         print('Size was set to screensize but position is not 0, 0')
         print('Position is forced to be 0, 0')
+    config['monitor'] = validate_monitor(parser.get('Window', 'monitor', fallback='primary'))
+    config['suspend_hidden'] = parser.getboolean('Window', 'suspend_hidden', fallback=True)
 
     config['device'] = parser.get('Listen', 'device')
     config['apps'] = validate_apps(parser.get('Listen', 'apps'))
+    config['capture'] = validate_capture(parser.get('Listen', 'capture', fallback='device'),
+                                         config['apps'])
 
     config['color'] = validate_color(parser.get('Bars', 'color'))
     config['padding'] = parser.getint('Bars', 'padding')
@@ -30,17 +37,61 @@ def parse_config(config_path: str) -> dict[str, bool | int | str | tuple | list]
     config['left_offset'] = parser.getint('Bars', 'left_offset')
     config['top_offset'] = parser.getint('Bars', 'top_offset')
     config['bands_distr'] = validate_distr(parser.get('Bars', 'distr'))
-    # config['use_interpolation'] = parser.getboolean('Bars', 'use_interpolation')
+    config['interpolation'] = validate_interpolation(
+        parser.get('Bars', 'interpolation', fallback='none'))
+    config['display_bars'] = validate_display_bars(
+        parser.getint('Bars', 'display_bars', fallback=128))
 
-    # config['gradient'] = validate_gradient(parser.get('Effect', 'gradient'))
+    config['rasterizer'] = validate_rasterizer(
+        parser.get('Bars', 'rasterizer', fallback='cairo'))
+
+    config['gradient'] = validate_gradient(parser.get('Effect', 'gradient', fallback='None'))
     config['rotation'] = validate_rotation(parser.getint('Effect', 'rotation'))
     config['monstercat'] = validate_monstercat(parser.getfloat('Effect', 'monstercat'))
+    config['beat_flash'] = validate_beat_flash(
+        parser.getfloat('Effect', 'beat_flash', fallback=0.0))
+    config['mode'] = validate_mode(parser.get('Effect', 'mode', fallback='bars'))
+    config['colormap'] = validate_colormap(parser.get('Effect', 'colormap', fallback='color'))
 
     config['frequency'] = validate_frequency(parser.getint('Spectrum', 'frequency'))
     config['window_type'] = validate_window(parser.get('Spectrum', 'window'))
-    # config['weighting_type'] = validate_weighting(parser.get('Spectrum', 'weighting'))
+    config['weighting_type'] = validate_weighting(
+        parser.get('Spectrum', 'weighting', fallback='Z'))
+    config['scale'] = validate_scale(parser.get('Spectrum', 'scale', fallback='linear'))
+    config['db_range'] = validate_db_range(parser.get('Spectrum', 'db_range', fallback='-30,40'))
     config['lower_freq'], config['upper_freq'] = validate_freq_bounds(
         parser.getint('Spectrum', 'lower_freq'), parser.getint('Spectrum', 'upper_freq'))
+    config['beats'] = parser.getboolean('Spectrum', 'beats', fallback=False)
+
+    config['shared_memory'] = validate_shared_memory(
+        parser.get('Publish', 'shared_memory', fallback='None'))
+    config['history'] = validate_history(parser.get('Publish', 'history', fallback='None'))
+    config['history_spectrum'] = parser.getboolean('Publish', 'history_spectrum',
+                                                   fallback=False)
+    config['replay'] = None  # set from command line
+
+    config['isolation'] = validate_isolation(
+        parser.get('Engine', 'isolation', fallback='thread'))
+
+    config['overrun'] = validate_overrun(parser.get('Engine', 'overrun', fallback='batch'))
+
+    config['affinity'] = validate_affinity(parser.get('Engine', 'affinity', fallback='None'))
+    config['scheduling'] = validate_scheduling(
+        parser.get('Engine', 'scheduling', fallback='other'))
+    config['priority'] = validate_priority(parser.getint('Engine', 'priority', fallback=10))
+    config['niceness'] = validate_niceness(parser.getint('Engine', 'niceness', fallback=0))
+
+    config['analysis_rate'] = validate_analysis_rate(
+        parser.get('Engine', 'analysis_rate', fallback='1'))
+
+    config['fft_engine'] = validate_fft_engine(
+        parser.get('Engine', 'fft_engine', fallback='numpy'))
+    config['precision'] = validate_precision(
+        parser.get('Engine', 'precision', fallback='double'))
+    config['threads'] = validate_threads(parser.getint('Engine', 'threads', fallback=1))
+    config['jit'] = validate_jit(parser.get('Engine', 'jit', fallback='auto'))
+    config['profile'] = validate_profile(parser.get('Engine', 'profile', fallback='auto'))
+    config['adaptive_quality'] = parser.getboolean('Engine', 'adaptive_quality', fallback=False)
 
     # discouraged to be set by user
     config['frame_size'] = 8192  # or 8 * buffer_size
@@ -48,22 +99,106 @@ def parse_config(config_path: str) -> dict[str, bool | int | str | tuple | list]
     config['channels'] = 1
     config['noise_reduction'] = 0.8
 
+    # parameters chosen by `audioviz --autotune` for this machine
+    if config['profile'] is not None and os.path.exists(config['profile']):
+        profile = load_profile(config['profile'])
+        # sizes meet latency and resolution targets only at sample rate they were tuned for
+        if profile.get('frequency') != config['frequency']:
+            print('Profile {} was tuned for {} Hz and is not used at {} Hz, '
+                  'run `audioviz --autotune` again.'.format(
+                      config['profile'], profile.get('frequency'), config['frequency']))
+        else:
+            config['frame_size'] = profile['frame_size']
+            config['buffer_size'] = profile['buffer_size']
+            if not parser.has_option('Engine', 'fft_engine'):
+                config['fft_engine'] = profile['fft_engine']
+
+    # additional windows share analysis and override appearance of the main one
+    config['windows'] = [dict(config)]
+    for section in parser.sections():
+        if section.startswith(WINDOW_SECTION_PREFIX):
+            window_config = dict(config['windows'][0])
+            for option in parser.options(section):
+                window_config[option] = parse_window_option(parser, section, option)
+            config['windows'].append(window_config)
+    # flashing needs beats
+    if any(window['beat_flash'] for window in config['windows']):
+        config['beats'] = True
+
     return config
 
 
+def parse_window_option(parser: ConfigParser, section: str, option: str):
+    match option:
+        case 'fps':
+            return validate_fps(parser.getint(section, option))
+        case 'size':
+            return validate_size(parser.get(section, option))
+        case 'position':
+            return validate_position(parser.get(section, option))
+        case 'monitor':
+            return validate_monitor(parser.get(section, option))
+        case 'color':
+            return validate_color(parser.get(section, option))
+        case 'padding' | 'right_offset' | 'bot_offset' | 'left_offset' | 'top_offset':
+            return parser.getint(section, option)
+        case 'interpolation':
+            return validate_interpolation(parser.get(section, option))
+        case 'display_bars':
+            return validate_display_bars(parser.getint(section, option))
+        case 'rotation':
+            return validate_rotation(parser.getint(section, option))
+        case 'monstercat':
+            return validate_monstercat(parser.getfloat(section, option))
+        case 'rasterizer':
+            return validate_rasterizer(parser.get(section, option))
+        case 'gradient':
+            return validate_gradient(parser.get(section, option))
+        case 'beat_flash':
+            return validate_beat_flash(parser.getfloat(section, option))
+        case 'mode':
+            return validate_mode(parser.get(section, option))
+        case 'colormap':
+            return validate_colormap(parser.get(section, option))
+
+
+# sections like [Window 2] describe additional windows
+WINDOW_SECTION_PREFIX = 'Window '
+WINDOW_OPTIONS = [
+    'fps', 'size', 'position', 'monitor',
+    'color', 'padding', 'right_offset', 'bot_offset', 'left_offset', 'top_offset',
+    'interpolation', 'display_bars', 'rasterizer',
+    'gradient', 'rotation', 'monstercat', 'beat_flash', 'mode', 'colormap'
+]
+
+
 def validate_sections_and_options(parser: ConfigParser):
-    valid_secitons = ['Window', 'Listen', 'Bars', 'Effect', 'Spectrum']
+    valid_secitons = ['Window', 'Listen', 'Bars', 'Effect', 'Spectrum', 'Publish', 'Engine']
     valid_options = [
-        'fps', 'size', 'position',
-        'device', 'apps',
+        'fps', 'size', 'position', 'monitor', 'suspend_hidden',
+        'device', 'apps', 'capture',
         'color', 'padding', 'right_offset', 'bot_offset', 'left_offset', 'top_offset', 'distr',
-        'rotation', 'monstercat',
-        'frequency', 'channels', 'window', 'weighting', 'lower_freq', 'upper_freq'
+        'interpolation', 'display_bars', 'rasterizer',
+        'gradient', 'rotation', 'monstercat', 'beat_flash', 'mode', 'colormap',
+        'frequency', 'channels', 'window', 'weighting', 'scale', 'db_range',
+        'lower_freq', 'upper_freq', 'beats',
+        'shared_memory', 'history', 'history_spectrum',
+        'isolation', 'overrun', 'affinity', 'scheduling', 'priority', 'niceness',
+        'analysis_rate', 'fft_engine', 'precision', 'threads',
+        'jit', 'profile', 'adaptive_quality'
     ]
 
     invalid_section_suggestions = []
     invalid_option_suggestions = []
     for section in parser.sections():
+        if section.startswith(WINDOW_SECTION_PREFIX):
+            for option in parser.options(section):
+                if option not in WINDOW_OPTIONS:
+                    invalid_option_suggestions.append((
+                        option,
+                        get_close_matches(option, WINDOW_OPTIONS, 1)[0]
+                    ))
+            continue
         if section not in valid_secitons:
             invalid_section_suggestions.append((
                 section,
@@ -129,6 +264,18 @@ def validate_position(position: str) -> tuple[int, int]:
     return tuple(position)
 
 
+def validate_monitor(monitor: str) -> str | int:
+    if monitor == 'primary':
+        return monitor
+
+    monitor = int(monitor)
+    if monitor < 0:
+        raise ValueError('Wrong value for `monitor` parameter. '
+                         'Value cannot be negative.')
+
+    return monitor
+
+
 def validate_apps(apps: str) -> list[str]:
     if apps == 'None':
         return []
@@ -136,6 +283,18 @@ def validate_apps(apps: str) -> list[str]:
     return [val.strip() for val in apps.split(',')]
 
 
+def validate_capture(capture: str, apps: list[str]) -> str:
+    if capture not in ['device', 'apps']:
+        raise ValueError('Wrong value for `capture` parameter. '
+                         'Valid options: device, apps.')
+    if capture == 'apps' and not apps:
+        raise ValueError('Capture of apps requires `apps` parameter to be set.')
+    if capture == 'apps' and shutil.which('parec') is None:
+        raise ValueError('Capture of apps requires `parec` utility (pulseaudio-utils).')
+
+    return capture
+
+
 def validate_color(color: str) -> tuple[int, int, int, int]:
     if len(color) != 8:
         raise ValueError('Wrong value for `color` parameter. '
@@ -154,19 +313,19 @@ def validate_distr(distr: str) -> tuple[str, int]:
 
     distr[1] = int(distr[1])
     if distr[0] == 'octave':
-        if distr[1] > 12:
+        if distr[1] > 48:
             raise ValueError('Fraction value for octave is too large. '
-                             'Consider using value in range 1..12 (1-octave..1/12-octave).')
+                             'Consider using value in range 1..48 (1-octave..1/48-octave).')
         if distr[1] < 1:
             raise ValueError('Fraction value for octave is too low. '
-                             'Consider using value in range 1..12 (1-octave..1/12-octave).')
+                             'Consider using value in range 1..48 (1-octave..1/48-octave).')
     elif distr[0] == 'logspace':
-        if distr[1] > 128:  # 256
+        if distr[1] > 1024:
             raise ValueError('Bars number value for logspace is too large. '
-                             'Consider using value in range 1..128.')
+                             'Consider using value in range 1..1024.')
         if distr[1] < 1:
             raise ValueError('Bars number value for logspace is too low. '
-                             'Consider using value in range 1..128.')
+                             'Consider using value in range 1..1024.')
     else:
         raise ValueError('Wrong value for `distr` parameter. '
                          'Valid options: octave, logspace.')
@@ -174,6 +333,37 @@ def validate_distr(distr: str) -> tuple[str, int]:
     return tuple(distr)
 
 
+def validate_interpolation(interpolation: str) -> str:
+    if interpolation not in ['none', 'linear', 'cubic']:
+        raise ValueError('Wrong value for `interpolation` parameter. '
+                         'Valid options: none, linear, cubic.')
+
+    return interpolation
+
+
+def validate_display_bars(display_bars: int) -> int:
+    if display_bars < 1 or display_bars > 1024:
+        raise ValueError('Wrong value for `display_bars` parameter. '
+                         'Consider using value in range 1..1024.')
+
+    return display_bars
+
+
+def validate_rasterizer(rasterizer: str) -> str:
+    if rasterizer not in ['cairo', 'software']:
+        raise ValueError('Wrong value for `rasterizer` parameter. '
+                         'Valid options: cairo, software.')
+
+    return rasterizer
+
+
+def validate_gradient(gradient: str) -> tuple[int, int, int, int] | None:
+    if gradient == 'None':
+        return None
+
+    return validate_color(gradient)
+
+
 def validate_rotation(rotation: int) -> int:
     if rotation not in [0, 90, 180, 270]:
         raise ValueError('Wrong value for `rotatation` parameter. '
@@ -187,6 +377,32 @@ def validate_monstercat(monstercat: float) -> float:
         raise ValueError('Wrongs value for `monstercat` parameter. '
                          'Value should be positive.')
 
+    return monstercat
+
+
+def validate_beat_flash(beat_flash: float) -> float:
+    if beat_flash < 0.0 or beat_flash > 1.0:
+        raise ValueError('Wrong value for `beat_flash` parameter. '
+                         'Value should be in range 0..1.')
+
+    return beat_flash
+
+
+def validate_mode(mode: str) -> str:
+    if mode not in ['bars', 'waterfall']:
+        raise ValueError('Wrong value for `mode` parameter. '
+                         'Valid options: bars, waterfall.')
+
+    return mode
+
+
+def validate_colormap(colormap: str) -> str:
+    if colormap not in ['color', 'magma', 'gray']:
+        raise ValueError('Wrong value for `colormap` parameter. '
+                         'Valid options: color, magma, gray.')
+
+    return colormap
+
 
 def validate_frequency(frequency: int) -> int:
     if frequency < 0:
@@ -218,6 +434,180 @@ def validate_weighting(weighting_type: str) -> str:
     return weighting_type
 
 
+def validate_scale(scale: str) -> str:
+    if scale not in ['linear', 'db']:
+        raise ValueError('Wrong value for `scale` parameter. '
+                         'Valid options: linear, db.')
+
+    return scale
+
+
+def validate_db_range(db_range: str) -> tuple[float, float]:
+    db_range = [float(val) for val in db_range.split(',')]
+
+    if len(db_range) != 2:
+        raise ValueError('Wrong value for `db_range` parameter. '
+                         'It should contain two numbers.')
+    if db_range[0] >= db_range[1]:
+        raise ValueError('Wrong value for `db_range` parameter. '
+                         'Values should make up a positive range.')
+
+    return tuple(db_range)
+
+
+def validate_shared_memory(name: str) -> str | None:
+    if name == 'None':
+        return None
+
+    if '/' in name:
+        raise ValueError('Wrong value for `shared_memory` parameter. '
+                         'Name cannot contain slashes.')
+
+    return name
+
+
+def validate_history(path: str) -> str | None:
+    if path == 'None':
+        return None
+
+    path = os.path.expanduser(path)
+    directory = os.path.dirname(path) or '.'
+    if not os.path.isdir(directory):
+        raise ValueError('Wrong value for `history` parameter. '
+                         'Directory {} does not exist.'.format(directory))
+
+    return path
+
+
+def validate_isolation(isolation: str) -> str:
+    if isolation not in ['thread', 'process']:
+        raise ValueError('Wrong value for `isolation` parameter. '
+                         'Valid options: thread, process.')
+
+    return isolation
+
+
+def validate_overrun(overrun: str) -> str:
+    if overrun not in ['none', 'drop', 'batch', 'degrade']:
+        raise ValueError('Wrong value for `overrun` parameter. '
+                         'Valid options: none, drop, batch, degrade.')
+
+    return overrun
+
+
+def validate_affinity(affinity: str) -> tuple[int, ...] | None:
+    if affinity == 'None':
+        return None
+
+    cores = set()
+    try:
+        for part in affinity.split(','):
+            first, _, last = part.strip().partition('-')
+            cores.update(range(int(first), int(last or first) + 1))
+    except ValueError:
+        raise ValueError('Wrong value for `affinity` parameter. '
+                         'It should contain comma-separated core numbers or ranges, '
+                         'e.g. 2,3 or 2-3.')
+    if not cores or min(cores) < 0:
+        raise ValueError('Wrong value for `affinity` parameter. '
+                         'Core numbers should be non-negative.')
+
+    return tuple(sorted(cores))
+
+
+def validate_scheduling(scheduling: str) -> str:
+    if scheduling not in ['other', 'fifo', 'rr']:
+        raise ValueError('Wrong value for `scheduling` parameter. '
+                         'Valid options: other, fifo, rr.')
+
+    return scheduling
+
+
+def validate_priority(priority: int) -> int:
+    if not 1 <= priority <= 99:
+        raise ValueError('Wrong value for `priority` parameter. '
+                         'Value should be in range 1..99.')
+
+    return priority
+
+
+def validate_niceness(niceness: int) -> int:
+    if not -20 <= niceness <= 19:
+        raise ValueError('Wrong value for `niceness` parameter. '
+                         'Value should be in range -20..19.')
+
+    return niceness
+
+
+def validate_analysis_rate(analysis_rate: str) -> float | None:
+    if analysis_rate == 'None':
+        return None
+
+    analysis_rate = float(analysis_rate)
+    if analysis_rate <= 0:
+        raise ValueError('Wrong value for `analysis_rate` parameter. '
+                         'Value should be positive.')
+
+    return analysis_rate
+
+
+def validate_fft_engine(fft_engine: str) -> str:
+    if fft_engine not in ['numpy', 'scipy', 'pyfftw']:
+        raise ValueError('Wrong value for `fft_engine` parameter. '
+                         'Valid options: numpy, scipy, pyfftw.')
+
+    return fft_engine
+
+
+def validate_precision(precision: str) -> str:
+    if precision not in ['single', 'double']:
+        raise ValueError('Wrong value for `precision` parameter. '
+                         'Valid options: single, double.')
+
+    return precision
+
+
+def validate_threads(threads: int) -> int:
+    if threads < 0:
+        raise ValueError('Wrong value for `threads` parameter. '
+                         'Value should be 0 (all cores) or positive.')
+
+    return threads
+
+
+def validate_jit(jit: str) -> str:
+    if jit not in ['auto', 'numba', 'numpy']:
+        raise ValueError('Wrong value for `jit` parameter. '
+                         'Valid options: auto, numba, numpy.')
+
+    return jit
+
+
+def validate_profile(profile: str) -> str | None:
+    if profile == 'None':
+        return None
+    if profile == 'auto':
+        return default_profile_path()
+
+    return os.path.expanduser(profile)
+
+
+def default_profile_path() -> str:
+    config_home = os.environ.get('XDG_CONFIG_HOME', os.path.expanduser('~/.config'))
+    return os.path.join(config_home, 'audioviz', 'profile.json')
+
+
+def load_profile(path: str) -> dict:
+    with open(path) as file:
+        profile = json.load(file)
+
+    if profile['buffer_size'] >= profile['frame_size']:
+        raise ValueError('Wrong profile {}. '
+                         'Buffer size should be less than frame size.'.format(path))
+
+    return profile
+
+
 def validate_freq_bounds(lower_freq: int, upper_freq: int) -> tuple[int, int]:
     if lower_freq <= 0:
         raise ValueError('Wrong value for `lower_freq` parameter. '
@@ -0,0 +1,432 @@
+"""Toolkit independent drawing of bars and waterfall on cairo context
+"""
+
+
+import cairo
+import numpy as np
+
+from .effect import calc_color_lut, calc_colormap, calc_interpolation_matrix, monstercat
+from .filter import calc_threads
+from .jit import jit_engine, set_threads
+
+
+if jit_engine() == 'numba':
+    from numba import njit, prange
+
+
+class BarsPainter:
+    def __init__(self, config: dict, bars_num: int):
+        self.bars_num = bars_num
+        # analysed bands are expanded to display bars count
+        self.interpolation = None
+        if config['interpolation'] != 'none':
+            self.interpolation = calc_interpolation_matrix(
+                bars_num, config['display_bars'], config['interpolation'])
+            self.bars_num = config['display_bars']
+        # subscribers deliver double precision frames, `np.dot` cannot downcast into `out`
+        self.heights = np.zeros(self.bars_num)
+        # frame whose heights were computed by `damage`, its paint reuses them
+        self.damaged_mags = None
+        self.bars_color = tuple(config['color'])
+        # colour of the bar tip, bars fade into it from the base
+        self.gradient = config['gradient']
+        self.source = cairo.SolidPattern(*self.bars_color)
+        self.bars_padding = config['padding']
+        self.right_offset = config['right_offset']
+        self.bot_offset = config['bot_offset']
+        self.left_offset = config['left_offset']
+        self.top_offset = config['top_offset']
+
+        self.rotation = config['rotation']
+        self.monstercat = config['monstercat']
+
+        self.width = 0
+        self.height = 0
+        self.bars_start_pos = 0
+        self.bars_max_height = 0
+        self.bar_width = 1
+        self.bar_positions = []
+        self.scaled_interpolation = None
+
+    def resize(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.damaged_mags = None
+
+        if self.rotation == 0:
+            self.bars_start_pos = height - self.bot_offset
+            self.bars_max_height = self.bars_start_pos - self.top_offset
+
+            total_bars_width = (width - self.right_offset - self.left_offset) \
+                - self.bars_padding * (self.bars_num - 1)
+        elif self.rotation == 90:
+            self.bars_start_pos = width - self.right_offset
+            self.bars_max_height = self.bars_start_pos - self.left_offset
+
+            total_bars_width = (height - self.bot_offset - self.top_offset) \
+                - self.bars_padding * (self.bars_num - 1)
+        elif self.rotation == 180:
+            self.bars_start_pos = self.top_offset
+            self.bars_max_height = height - self.bot_offset
+
+            total_bars_width = (width - self.right_offset - self.left_offset) \
+                - self.bars_padding * (self.bars_num - 1)
+        else:
+            self.bars_start_pos = self.left_offset
+            self.bars_max_height = width - self.right_offset
+
+            total_bars_width = (height - self.bot_offset - self.top_offset) \
+                - self.bars_padding * (self.bars_num - 1)
+        self.bar_width = max(int(total_bars_width / self.bars_num), 1)
+
+        # positions of bars are computed once per resize and kept as python numbers,
+        # so painting does not convert numpy scalars for every rectangle
+        steps = (self.bar_width + self.bars_padding) * np.arange(self.bars_num)
+        if self.rotation == 0:
+            positions = self.left_offset + steps
+        elif self.rotation == 90:
+            positions = height - self.bot_offset - steps
+        elif self.rotation == 180:
+            positions = width - self.right_offset - steps
+        else:
+            positions = self.top_offset + steps
+        self.bar_positions = positions.tolist()
+
+        if self.interpolation is not None:
+            # scale is folded into matrix, so heights take a single pass
+            self.scaled_interpolation = self.bars_max_height * self.interpolation
+
+        if self.gradient is not None:
+            if self.rotation == 0:
+                tip = (0, self.bars_start_pos, 0, self.bars_start_pos - self.bars_max_height)
+            elif self.rotation == 90:
+                tip = (self.bars_start_pos, 0, self.bars_start_pos - self.bars_max_height, 0)
+            elif self.rotation == 180:
+                tip = (0, self.bars_start_pos, 0, self.bars_start_pos + self.bars_max_height)
+            else:
+                tip = (self.bars_start_pos, 0, self.bars_start_pos + self.bars_max_height, 0)
+            self.source = cairo.LinearGradient(*tip)
+            self.source.add_color_stop_rgba(0, *self.bars_color)
+            self.source.add_color_stop_rgba(1, *self.gradient)
+
+    def push(self, band_mags: np.ndarray):
+        # bars show only the latest frame
+        pass
+
+    def bounds(self, extent: float | None = None) -> tuple[int, int, int, int]:
+        """Rectangle (x, y, width, height) covering bars up to `extent` pixels high,
+        by default up to the highest possible bars.
+        """
+        if extent is None:
+            extent = self.bars_max_height
+        # antialiased edges of fractional heights touch one more pixel
+        top = int(extent) + 1
+        span = self.bars_num * (self.bar_width + self.bars_padding) - self.bars_padding
+        start = int(self.bars_start_pos)
+
+        if self.rotation == 0:
+            return self.left_offset, start - top, span, top
+        elif self.rotation == 90:
+            return start - top, self.height - self.bot_offset - span, top, span
+        elif self.rotation == 180:
+            return self.width - self.right_offset - span, start, span, top
+        else:
+            return start, self.top_offset, top, span
+
+    def damage(self, band_mags: np.ndarray) -> tuple[int, int, int, int]:
+        """Rectangle covering bars of `band_mags` frame.
+        """
+        heights = self.calc_heights(band_mags)
+        self.damaged_mags = band_mags
+        return self.bounds(heights.max(initial=0))
+
+    def frame_heights(self, band_mags: np.ndarray) -> np.ndarray:
+        """Heights of `band_mags` frame to paint, computed by `damage` if it was called.
+        """
+        heights = self.heights if band_mags is self.damaged_mags else self.calc_heights(band_mags)
+        self.damaged_mags = None
+        return heights
+
+    def calc_heights(self, band_mags: np.ndarray) -> np.ndarray:
+        heights = self.heights
+        if self.interpolation is None:
+            np.multiply(band_mags, self.bars_max_height, out=heights)
+        else:
+            np.dot(self.scaled_interpolation, band_mags, out=heights)
+            # cubic spline might overshoot below zero
+            np.maximum(heights, 0, out=heights)
+        # skipped when quality is reduced
+        if self.monstercat is not None:
+            monstercat(heights, self.monstercat)
+
+        return heights
+
+    def paint(self, cr: cairo.Context, band_mags: np.ndarray):
+        cr.set_source(self.source)
+
+        heights = self.frame_heights(band_mags).tolist()
+        start = self.bars_start_pos
+        width = self.bar_width
+
+        if self.rotation == 0:
+            for x, height in zip(self.bar_positions, heights):
+                cr.rectangle(x, start, width, -height)
+        elif self.rotation == 90:
+            for y, height in zip(self.bar_positions, heights):
+                cr.rectangle(start, y, -height, -width)
+        elif self.rotation == 180:
+            for x, height in zip(self.bar_positions, heights):
+                cr.rectangle(x, start, -width, height)
+        else:
+            for y, height in zip(self.bar_positions, heights):
+                cr.rectangle(start, y, height, width)
+        cr.fill()
+
+
+def _rasterize_bars(pixels, heights, prev_heights, bar_step, bar_width, lut):
+    # touches only rows between previous and new height of every bar,
+    # base of bars is the last row
+    rows, columns = pixels.shape
+    for bar in prange(heights.size):
+        height = min(int(heights[bar] + 0.5), rows)
+        prev_height = prev_heights[bar]
+        start = bar * bar_step
+        end = min(start + bar_width, columns)
+        for level in range(prev_height, height):
+            pixels[rows - 1 - level, start:end] = lut[level]
+        for level in range(height, prev_height):
+            pixels[rows - 1 - level, start:end] = 0
+        prev_heights[bar] = height
+
+
+def _rasterize_bars_numpy(pixels, heights, prev_heights, bar_step, bar_width, lut):
+    # changed bars only, each is a single block assignment
+    rows, columns = pixels.shape
+    new_heights = np.minimum((heights + 0.5).astype(np.int64), rows)
+    for bar in np.flatnonzero(new_heights != prev_heights):
+        height = new_heights[bar]
+        prev_height = prev_heights[bar]
+        start = bar * bar_step
+        end = min(start + bar_width, columns)
+        if height > prev_height:
+            pixels[rows - height:rows - prev_height, start:end] = \
+                lut[prev_height:height, None][::-1]
+        else:
+            pixels[rows - prev_height:rows - height, start:end] = 0
+    prev_heights[:] = new_heights
+
+
+if jit_engine() == 'numba':
+    # bars own disjoint columns, parallel version splits them between threads
+    rasterize_bars = njit(_rasterize_bars)
+    rasterize_bars_parallel = njit(parallel=True)(_rasterize_bars)
+else:
+    rasterize_bars = rasterize_bars_parallel = _rasterize_bars_numpy
+
+
+class RasterPainter(BarsPainter):
+    """Rasterizes bars in software into persistent ARGB32 buffer.
+
+    Buffer holds unrotated bars with base at the bottom, every frame only changed
+    part of each bar is redrawn and the buffer is blitted with a single paint.
+    """
+
+    def __init__(self, config: dict, bars_num: int):
+        super().__init__(config, bars_num)
+        self.prev_heights = np.zeros(self.bars_num, dtype=np.int64)
+        self.lut = None
+        self.matrix = cairo.Matrix()
+        self.pixels = None
+        self.surface = None
+
+        self.threads = calc_threads(config['threads'], self.bars_num)
+
+    def resize(self, width: int, height: int):
+        super().resize(width, height)
+
+        bar_step = self.bar_width + self.bars_padding
+        columns = max(self.bars_num * bar_step - self.bars_padding, 1)
+        rows = max(int(self.bars_max_height), 1)
+        base = self.bars_start_pos
+        if self.rotation == 0:
+            self.matrix = cairo.Matrix(1, 0, 0, 1, self.left_offset, base - rows)
+        elif self.rotation == 90:
+            self.matrix = cairo.Matrix(0, -1, 1, 0, base - rows, height - self.bot_offset)
+        elif self.rotation == 180:
+            self.matrix = cairo.Matrix(-1, 0, 0, -1, width - self.right_offset, base + rows)
+        else:
+            self.matrix = cairo.Matrix(0, 1, -1, 0, base + rows, self.top_offset)
+
+        # colour of every level from the base to the tip
+        self.lut = calc_color_lut(
+            [self.bars_color, self.bars_color if self.gradient is None else self.gradient], rows)
+        self.prev_heights[:] = 0
+        self.pixels = np.zeros((rows, columns), dtype=np.uint32)
+        self.surface = cairo.ImageSurface.create_for_data(
+            self.pixels, cairo.FORMAT_ARGB32, columns, rows, columns * 4)
+
+    def paint(self, cr: cairo.Context, band_mags: np.ndarray):
+        heights = self.frame_heights(band_mags)
+
+        self.surface.flush()
+        rasterize = rasterize_bars
+        if self.threads > 1:
+            set_threads(self.threads)
+            rasterize = rasterize_bars_parallel
+        rasterize(self.pixels, heights, self.prev_heights,
+                  self.bar_width + self.bars_padding, self.bar_width, self.lut)
+        self.surface.mark_dirty()
+
+        cr.save()
+        cr.transform(self.matrix)
+        cr.set_source_surface(self.surface, 0, 0)
+        cr.get_source().set_filter(cairo.FILTER_NEAREST)
+        cr.paint()
+        cr.restore()
+
+
+class WaterfallPainter:
+    """Scrolling spectrogram, each frame becomes one row (or column) of pixels.
+
+    Rows are written into a ring twice as long as the visible history, every row
+    twice, so the visible history is always a contiguous block of the image
+    and scrolling only advances the ring offset.
+    """
+
+    def __init__(self, config: dict, bars_num: int):
+        self.bars_num = bars_num
+        self.interpolation = None
+        if config['interpolation'] != 'none':
+            self.interpolation = calc_interpolation_matrix(
+                bars_num, config['display_bars'], config['interpolation'])
+            self.bars_num = config['display_bars']
+        self.colormap = calc_colormap(config['colormap'], config['color'])
+        self.values = np.zeros(self.bars_num)
+        self.levels = np.zeros(self.bars_num, dtype=np.intp)
+
+        self.right_offset = config['right_offset']
+        self.bot_offset = config['bot_offset']
+        self.left_offset = config['left_offset']
+        self.top_offset = config['top_offset']
+        self.rotation = config['rotation']
+
+        self.width = 0
+        self.height = 0
+        self.length = 1
+        self.offset = 0
+        self.matrix = cairo.Matrix()
+        self.pixels = None
+        self.surface = None
+
+    def resize(self, width: int, height: int):
+        self.width = width
+        self.height = height
+
+        area_width = max(width - self.right_offset - self.left_offset, 1)
+        area_height = max(height - self.bot_offset - self.top_offset, 1)
+
+        # one pixel per frame along time axis, newest frame is at the bars base,
+        # frequencies go in the same direction as bars
+        if self.rotation == 0:
+            self.length = area_height
+            scale = area_width / self.bars_num
+            self.matrix = cairo.Matrix(scale, 0, 0, 1, self.left_offset, self.top_offset)
+        elif self.rotation == 90:
+            self.length = area_width
+            scale = area_height / self.bars_num
+            self.matrix = cairo.Matrix(0, -scale, 1, 0, self.left_offset,
+                                       self.top_offset + area_height)
+        elif self.rotation == 180:
+            self.length = area_height
+            scale = area_width / self.bars_num
+            self.matrix = cairo.Matrix(-scale, 0, 0, -1, self.left_offset + area_width,
+                                       self.top_offset + area_height)
+        else:
+            self.length = area_width
+            scale = area_height / self.bars_num
+            self.matrix = cairo.Matrix(0, scale, -1, 0, self.left_offset + area_width,
+                                       self.top_offset)
+
+        # history is dropped on resize
+        self.offset = 0
+        self.pixels = np.zeros((2 * self.length, self.bars_num), dtype=np.uint32)
+        self.surface = cairo.ImageSurface.create_for_data(
+            self.pixels, cairo.FORMAT_ARGB32, self.bars_num, 2 * self.length,
+            self.bars_num * 4)
+
+    def push(self, band_mags: np.ndarray):
+        """Appends frame to history, cost does not depend on history length.
+        """
+        values = self.values
+        if self.interpolation is None:
+            np.multiply(band_mags, self.colormap.size - 1, out=values)
+        else:
+            np.dot(self.interpolation, band_mags, out=values)
+            values *= self.colormap.size - 1
+        np.clip(values, 0, self.colormap.size - 1, out=values)
+        self.levels[:] = values
+
+        self.surface.flush()
+        row = self.pixels[self.offset]
+        np.take(self.colormap, self.levels, out=row)
+        self.pixels[self.offset + self.length] = row
+        self.surface.mark_dirty_rectangle(0, self.offset, self.bars_num, 1)
+        self.surface.mark_dirty_rectangle(0, self.offset + self.length, self.bars_num, 1)
+        self.offset = (self.offset + 1) % self.length
+
+    def bounds(self, extent: float | None = None) -> tuple[int, int, int, int]:
+        area_width = max(self.width - self.right_offset - self.left_offset, 1)
+        area_height = max(self.height - self.bot_offset - self.top_offset, 1)
+        return self.left_offset, self.top_offset, area_width, area_height
+
+    def damage(self, band_mags: np.ndarray) -> tuple[int, int, int, int]:
+        # every frame scrolls the whole history
+        return self.bounds()
+
+    def paint(self, cr: cairo.Context, band_mags: np.ndarray):
+        # rows from the oldest frame to the newest one, `band_mags` are already pushed
+        cr.save()
+        cr.transform(self.matrix)
+        cr.set_source_surface(self.surface, 0, -self.offset)
+        cr.get_source().set_filter(cairo.FILTER_NEAREST)
+        cr.rectangle(0, 0, self.bars_num, self.length)
+        cr.fill()
+        cr.restore()
+
+
+def create_painter(config: dict, bars_num: int) -> BarsPainter | WaterfallPainter:
+    if config['mode'] == 'waterfall':
+        return WaterfallPainter(config, bars_num)
+    if config['rasterizer'] == 'software':
+        return RasterPainter(config, bars_num)
+
+    return BarsPainter(config, bars_num)
+
+
+def union_rect(first: tuple[int, int, int, int],
+               second: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
+    x = min(first[0], second[0])
+    y = min(first[1], second[1])
+    return (x, y, max(first[0] + first[2], second[0] + second[2]) - x,
+            max(first[1] + first[3], second[1] + second[3]) - y)
+
+
+def paint_flash(cr: cairo.Context, level: float):
+    # brightens only what is already drawn, background stays transparent
+    cr.set_source_rgba(1.0, 1.0, 1.0, level)
+    cr.set_operator(cairo.OPERATOR_ATOP)
+    cr.paint()
+    cr.set_operator(cairo.OPERATOR_OVER)
+
+
+def calc_flash_decay(fps: int, duration: float = 0.2) -> float:
+    """Per frame multiplier fading flash to a tenth in `duration` seconds.
+    """
+    return 0.1 ** (1 / (duration * fps))
+
+
+def clear(cr: cairo.Context):
+    cr.set_source_rgba(1.0, 1.0, 1.0, 0.0)
+    cr.set_operator(cairo.OPERATOR_SOURCE)
+    cr.paint()
+    cr.set_operator(cairo.OPERATOR_OVER)
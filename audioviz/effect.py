@@ -2,16 +2,103 @@
 """
 
 
-from numba import njit
-
-
-@njit
-def monstercat(band_mags, base=2.0):
-    # rebalance bars heights to follow exponent curve shape
-    for bar in range(band_mags.size):
-        for prev_bar in range(bar - 1, -1, -1):
-            distance = bar - prev_bar
-            band_mags[prev_bar] = max(band_mags[bar] / pow(base, distance), band_mags[prev_bar])
-        for next_bar in range(bar + 1, band_mags.size):
-            distance = next_bar - bar
-            band_mags[next_bar] = max(band_mags[bar] / pow(base, distance), band_mags[next_bar])
+import numpy as np
+
+from .jit import jit_engine
+
+
+if jit_engine() == 'numba':
+    from numba import njit
+
+
+def _monstercat(band_mags, base=2.0):
+    # rebalance bars heights to follow exponent curve shape: every bar is raised to
+    # the highest bar divided by `base` to the power of distance, decay from the left
+    # and from the right is carried by two linear passes instead of visiting all pairs
+    for bar in range(1, band_mags.size):
+        band_mags[bar] = max(band_mags[bar - 1] / base, band_mags[bar])
+    for bar in range(band_mags.size - 2, -1, -1):
+        band_mags[bar] = max(band_mags[bar + 1] / base, band_mags[bar])
+
+
+def _monstercat_numpy(band_mags, base=2.0):
+    # decay with distance is linear in log domain, so both passes are cumulative maxima
+    with np.errstate(divide='ignore'):
+        logs = np.log(band_mags)
+    slope = np.log(base) * np.arange(band_mags.size)
+    left = np.maximum.accumulate(logs + slope) - slope
+    right = np.maximum.accumulate((logs - slope)[::-1])[::-1] + slope
+    raised = np.maximum(left, right)
+    # bars that are not raised keep exact values instead of rounded exp(log(x))
+    with np.errstate(invalid='ignore'):
+        band_mags[:] = np.where(raised - logs > 1e-9, np.exp(raised), band_mags)
+
+
+monstercat = njit(_monstercat) if jit_engine() == 'numba' else _monstercat_numpy
+
+
+def calc_interpolation_matrix(src_size: int, dst_size: int, kind: str = 'linear') -> np.ndarray:
+    """Builds matrix that maps `src_size` bars to `dst_size` bars with a single dot product.
+    """
+    positions = np.linspace(0, src_size - 1, dst_size)
+    if src_size == 1:
+        return np.ones((dst_size, 1))
+
+    left = np.minimum(np.floor(positions).astype(np.int64), src_size - 2)
+    t = positions - left
+    rows = np.arange(dst_size)
+
+    matrix = np.zeros((dst_size, src_size))
+    matrix[rows, left] = 1 - t
+    matrix[rows, left + 1] = t
+    if kind == 'linear' or src_size < 3:
+        return matrix
+
+    # natural cubic spline is linear in data, so second derivatives of each
+    # knot are expressed as a matrix applied to bars values
+    n = src_size
+    system = np.zeros((n, n))
+    rhs = np.zeros((n, n))
+    system[0, 0] = system[-1, -1] = 1
+    for i in range(1, n - 1):
+        system[i, i - 1:i + 2] = 1, 4, 1
+        rhs[i, i - 1:i + 2] = 6, -12, 6
+    second_derivs = np.linalg.solve(system, rhs)
+
+    a = 1 - t
+    b = t
+    matrix += ((a ** 3 - a)[:, None] * second_derivs[left]
+               + (b ** 3 - b)[:, None] * second_derivs[left + 1]) / 6
+    return matrix
+
+
+# colour stops (r, g, b, a) evenly spread from silence to the loudest level,
+# 'color' goes from transparent to bars colour
+COLORMAPS = {
+    'magma': [(0.0, 0.0, 0.02, 0.0), (0.32, 0.07, 0.5, 0.6), (0.72, 0.21, 0.47, 0.85),
+              (0.99, 0.53, 0.38, 1.0), (0.99, 0.99, 0.75, 1.0)],
+    'gray': [(1.0, 1.0, 1.0, 0.0), (1.0, 1.0, 1.0, 1.0)],
+}
+
+
+def calc_color_lut(stops: list, size: int) -> np.ndarray:
+    """Spreads colour stops (r, g, b, a) evenly over lookup table
+    of `size` premultiplied ARGB32 pixels.
+    """
+    stops = np.array(stops, dtype=np.float64)
+    levels = np.linspace(0, 1, size)
+    positions = np.linspace(0, 1, len(stops))
+    r, g, b, a = (np.interp(levels, positions, stops[:, channel]) for channel in range(4))
+
+    # cairo expects colour channels multiplied by alpha
+    r, g, b = (np.rint(channel * a * 255).astype(np.uint32) for channel in (r, g, b))
+    a = np.rint(a * 255).astype(np.uint32)
+
+    return (a << 24) | (r << 16) | (g << 8) | b
+
+
+def calc_colormap(name: str, color: tuple, size: int = 256) -> np.ndarray:
+    if name == 'color':
+        return calc_color_lut([(*color[:3], 0.0), color], size)
+
+    return calc_color_lut(COLORMAPS[name], size)
@@ -4,7 +4,59 @@
 import ctypes
 
 import numpy as np
-from numba import njit
+
+from .jit import available_threads, jit_engine
+
+
+if jit_engine() == 'numba':
+    from numba import njit, prange
+
+FFT_ENGINES = ['numpy', 'scipy', 'pyfftw']
+# below that many bars starting threads costs more than splitting bands saves
+PARALLEL_BARS = 256
+
+
+def get_rfft(engine: str = 'numpy'):
+    """Returns real fft function of the given engine, scipy and pyfftw are optional.
+    """
+    match engine:
+        case 'numpy':
+            return np.fft.rfft
+        case 'scipy':
+            import scipy.fft
+            return scipy.fft.rfft
+        case 'pyfftw':
+            import pyfftw.interfaces.cache
+            import pyfftw.interfaces.numpy_fft
+
+            # keep fftw plans between calls
+            pyfftw.interfaces.cache.enable()
+            pyfftw.interfaces.cache.set_keepalive_time(60)
+            return pyfftw.interfaces.numpy_fft.rfft
+        case _:
+            raise ValueError('Unknown fft engine: {}'.format(engine))
+
+
+def available_fft_engines() -> list[str]:
+    engines = []
+    for engine in FFT_ENGINES:
+        try:
+            get_rfft(engine)
+        except ImportError:
+            continue
+        engines.append(engine)
+
+    return engines
+
+
+def calc_threads(threads: int, bars: int) -> int:
+    """Number of threads to split bands between, `threads` 0 means all cores.
+    """
+    if bars < PARALLEL_BARS:
+        return 1
+
+    available = available_threads()
+    return min(threads or available, available)
 
 
 def shift_frame(frame: np.ndarray, buffer: ctypes.Array, overlap: int, buffer_size: int):
@@ -13,14 +65,14 @@ def shift_frame(frame: np.ndarray, buffer: ctypes.Array, overlap: int, buffer_si
 
 
 # @njit
-def calc_spectrum(fft_mags: np.ndarray, window: np.ndarray, frame: np.ndarray):
-    fft_mags[:] = np.abs(np.fft.rfft(window * frame))
+def calc_spectrum(fft_mags: np.ndarray, window: np.ndarray, frame: np.ndarray,
+                  rfft=np.fft.rfft):
+    np.abs(rfft(window * frame), out=fft_mags)
     # with numba.objmode():
     #     fft_mags[:] = np.fft.rfft(window * frame)
     # fft_mags[:] = np.abs(fft_mags)
 
 
-@njit
 def calc_freq_weights(frequencies: np.ndarray, weighting_type: str) -> np.ndarray:
     if weighting_type == 'A':
         a = np.power(12194.0, 2) * np.power(frequencies, 4)
@@ -39,7 +91,7 @@ def calc_freq_weights(frequencies: np.ndarray, weighting_type: str) -> np.ndarra
         weight = 20 * np.log10(r_c) + 0.06
         return weight
     elif weighting_type == 'Z':
-        return np.ones(frequencies.shape)
+        return np.zeros(frequencies.shape)
 
 
 def calc_octave_freq_bounds(fraction=3, freq_lower_bound=12, freq_upper_bound=20000,
@@ -72,13 +124,15 @@ def calc_octave_freq_bounds(fraction=3, freq_lower_bound=12, freq_upper_bound=20
         else:
             return g ** ((2 * center_idx - 59) / (2 * fraction))
 
-    center_freq = _ratio(g, center_idx, fraction) * fr
-
-    nth_freq = 0
-    while nth_freq * _band_edge(g, fraction) < freq_upper_bound:
-        center_idx += 1
-        nth_freq = _ratio(g, center_idx, fraction) * fr
-        center_freq = np.append(center_freq, nth_freq)
+    # indices of centres from the lowest one up to the first band reaching upper bound,
+    # the estimate of the last index is padded to be safe from rounding
+    last_idx = np.ceil(30 + fraction * np.log(freq_upper_bound / fr) / np.log(g)) + 2
+    center_idxs = np.arange(center_idx, max(last_idx, center_idx + 1) + 1)
+    # vectorized power may differ from scalar one in the last bit (e.g. with AVX-512),
+    # which moves rounded fft bounds, so every centre is computed as a scalar
+    center_freqs = np.array([_ratio(g, idx, fraction) for idx in center_idxs.tolist()]) * fr
+    reached = np.argmax(center_freqs[1:] * _band_edge(g, fraction) >= freq_upper_bound)
+    center_freq = center_freqs[:reached + 2]
 
     lower_bounds = center_freq / _band_edge(g, fraction)
     upper_bounds = center_freq * _band_edge(g, fraction)
@@ -90,41 +144,68 @@ def map_to_fft_bounds(oct_freq_lower_bounds, oct_freq_upper_bounds,
                       fft_size) -> tuple[np.ndarray, np.ndarray]:
     """Maps calculated octave frequency bounds to fft bounds
     """
-    num_splits = oct_freq_lower_bounds.size
-    lower_bounds = np.zeros(num_splits, np.int64)
-    upper_bounds = np.zeros(num_splits, np.int64)
     max_upper_bound = fft_size - 1
     ratio = fft_size / max(oct_freq_upper_bounds)
-    for i in range(num_splits):
-        lower_bounds[i] = np.clip(np.round(oct_freq_lower_bounds[i] * ratio), 0, max_upper_bound)
-        upper_bounds[i] = np.clip(np.round(oct_freq_upper_bounds[i] * ratio), 0, max_upper_bound)
+    lower_bounds = np.clip(np.round(oct_freq_lower_bounds * ratio), 0, max_upper_bound)
+    upper_bounds = np.clip(np.round(oct_freq_upper_bounds * ratio), 0, max_upper_bound)
+
+    return lower_bounds.astype(np.int64), upper_bounds.astype(np.int64)
 
-    return lower_bounds, upper_bounds
+
+def calc_logspace_freqs(bars, freq_lower_bound=12, freq_upper_bound=20000) -> np.ndarray:
+    """Lower frequencies of `bars` logarithmically spaced bands and the upper bound.
+    """
+    freqconst = np.log10(freq_lower_bound / freq_upper_bound) / (1 / (bars + 1) - 1)
+    steps = np.arange(1, bars + 2) / (bars + 1)
+    # single precision of the original per-bar loop is kept, bounds depend on its rounding
+    return (freq_upper_bound * np.power(10, freqconst * (-1) + steps * freqconst)).astype(
+        np.float32)
 
 
 def calc_logspace_fft_bounds(sample_frequency, bars, frame_size,
                              freq_lower_bound=12,
                              freq_upper_bound=20000) -> tuple[np.ndarray, np.ndarray]:
-    fft_lower_bounds = np.zeros(bars + 1, dtype=np.int32)
+    # numpy < 2 promotes single precision scalars of the original per-bar loop to double
+    # and numpy >= 2 does not, bounds are the same as the loop gives with either one
+    dtype = (np.float32(1) / 2.).dtype
+    fc = calc_logspace_freqs(bars, freq_lower_bound, freq_upper_bound).astype(dtype)
+    fc = (fc / (sample_frequency / 2)).astype(np.float32).astype(dtype)
+    fft_lower_bounds = (fc * (frame_size / 2)).astype(np.int32)
+
+    # every band takes at least one bin: lower bound of a band is above the previous one,
+    # i.e. `fft_lower_bounds - n` does not decrease
+    steps = np.arange(bars + 1, dtype=np.int32)
+    fft_lower_bounds = np.maximum.accumulate(fft_lower_bounds - steps) + steps
     fft_upper_bounds = np.zeros(bars + 1, dtype=np.int32)
+    fft_upper_bounds[:-1] = fft_lower_bounds[1:] - 1
 
-    freqconst = np.log10(freq_lower_bound / freq_upper_bound) / (1 / (bars + 1) - 1)
-    fc = np.zeros(bars + 1, dtype=np.float32)
-    for n in range(bars + 1):
-        fc[n] = freq_upper_bound * np.power(
-            10, freqconst * (-1) + (((n + 1) / (bars + 1)) * freqconst)
-        )
-        fc[n] = fc[n] / (sample_frequency / 2)
+    return fft_lower_bounds, fft_upper_bounds
 
-        fft_lower_bounds[n] = fc[n] * (frame_size / 2)
-        if (n != 0):
-            fft_upper_bounds[n - 1] = fft_lower_bounds[n] - 1
 
-            if (fft_lower_bounds[n] <= fft_lower_bounds[n - 1]):
-                fft_lower_bounds[n] = fft_lower_bounds[n - 1] + 1
-            fft_upper_bounds[n - 1] = fft_lower_bounds[n] - 1
+def calc_band_bounds(bands_distr, sample_frequency, frame_size,
+                     freq_lower_bound=12,
+                     freq_upper_bound=20000) -> tuple[np.ndarray, np.ndarray, int]:
+    fft_size = frame_size // 2 + 1
 
-    return fft_lower_bounds, fft_upper_bounds
+    if bands_distr[0] == 'octave':
+        oct_freq_lower_bounds, oct_freq_upper_bounds = calc_octave_freq_bounds(
+            bands_distr[1], freq_lower_bound, freq_upper_bound
+        )
+        fft_lower_bounds, fft_upper_bounds = map_to_fft_bounds(
+            oct_freq_lower_bounds, oct_freq_upper_bounds, fft_size
+        )
+        bars = fft_lower_bounds.size
+    elif bands_distr[0] == 'logspace':
+        bars = bands_distr[1]
+        fft_lower_bounds, fft_upper_bounds = calc_logspace_fft_bounds(
+            sample_frequency, bars, frame_size, freq_lower_bound, freq_upper_bound
+        )
+        # lowest bands take a bin each and push the rest up
+        if fft_upper_bounds[bars - 1] >= fft_size:
+            raise ValueError('Too many bars ({}) for frame size {}. '
+                             'Consider using fewer bars or larger frame.'.format(bars, frame_size))
+
+    return fft_lower_bounds, fft_upper_bounds, bars
 
 
 def calc_freq_amplifier(bars, frame_size,
@@ -142,69 +223,180 @@ def calc_freq_amplifier(bars, frame_size,
         np.log2(0.6), np.log2(0.3), bars + 1 - 2 * bars_third, base=2
     )
 
-    freqconst = np.log10(freq_lower_bound / freq_upper_bound) / (1 / (bars + 1) - 1)
-    fc = np.zeros(bars + 1, dtype=np.float32)
-    for n in range(bars + 1):
-        fc[n] = freq_upper_bound * np.power(
-            10, freqconst * (-1) + (((n + 1) / (bars + 1)) * freqconst)
-        )
-        amplifier[n] = fc[n] * amplifier[n] / np.log2(frame_size)
+    fc = calc_logspace_freqs(bars, freq_lower_bound, freq_upper_bound)
+    return fc * amplifier / np.log2(frame_size)
 
-    return amplifier
 
+def calc_bin_weights(frequencies: np.ndarray, weighting_type: str) -> np.ndarray:
+    """Converts weighting curve (in dB) to linear amplitude gain for each fft bin.
+    """
+    with np.errstate(divide='ignore'):
+        return np.power(10., calc_freq_weights(frequencies, weighting_type) / 20.)
 
-def filter_signal(fft_mags, frame, buffer, overlap, buffer_size, window,
-                  bars, fft_lower_bounds, fft_upper_bounds, adjustment, amplifier,
-                  band_mags, cava_mem, noise_reduction):
-    shift_frame(frame, buffer, overlap, buffer_size)
-    calc_spectrum(fft_mags, window, frame)
-    gather_energy(fft_mags, bars, fft_lower_bounds, fft_upper_bounds, adjustment, amplifier,
-                  band_mags, cava_mem, noise_reduction)
 
+def calc_band_gains(fft_lower_bounds, fft_upper_bounds, bars, bin_weights, amplifier,
+                    squared_window_sum, scale='linear') -> np.ndarray:
+    """Folds weighting, window power normalization and band amplifier into one gain vector.
 
-@njit
-def gather_energy(fft_mags, bars, fft_lower_bounds, fft_upper_bounds, adjustment, amplifier,
-                  band_mags, prev_mags, noise_reduction):
-    for n in range(bars):
-        energy = 0
-        for i in range(fft_lower_bounds[n], fft_upper_bounds[n] + 1):
-            energy += fft_mags[i]
+    Gains are laid out band by band in the order `gather_energy` walks fft bins.
+    `linear` gains apply to magnitudes, `db` gains apply to squared magnitudes
+    and yield band-averaged power spectral density.
+    """
+    counts = fft_upper_bounds[:bars] - fft_lower_bounds[:bars] + 1
+    bins, _ = calc_gain_layout(fft_lower_bounds, fft_upper_bounds, bars)
+    bands = np.repeat(np.arange(bars), counts)
 
-        energy /= fft_upper_bounds[n] - fft_lower_bounds[n] + 1
-        energy *= amplifier[n]
-        band_mags[n] = energy
+    if scale == 'linear':
+        return bin_weights[bins] * amplifier[bands] / counts[bands]
+
+    # power spectral density: (2 * |X|)^2 / sum(window^2)
+    return np.power(bin_weights[bins], 2) * 4. / squared_window_sum / counts[bands]
 
-    band_mags *= adjustment
+
+def calc_gain_layout(fft_lower_bounds, fft_upper_bounds, bars) -> tuple[np.ndarray, np.ndarray]:
+    """Fft bin of every gain and index of the first gain of every band (plus the total),
+    so bands can be gathered independently.
+    """
+    counts = fft_upper_bounds[:bars] - fft_lower_bounds[:bars] + 1
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    bins = np.arange(offsets[-1]) - np.repeat(offsets[:-1] - fft_lower_bounds[:bars], counts)
+
+    return bins.astype(np.int64), offsets
+
+
+def calc_band_mapping(fft_lower_bounds, fft_upper_bounds, bars, frame_size,
+                      other_lower_bounds, other_upper_bounds, other_bars,
+                      other_frame_size) -> np.ndarray:
+    """Index of the other band closest (on log scale) to every band,
+    bands of both layouts may come from different frame sizes.
+    """
+    centres = np.log((fft_lower_bounds[:bars] + fft_upper_bounds[:bars] + 1) / frame_size)
+    other_centres = np.log((other_lower_bounds[:other_bars] + other_upper_bounds[:other_bars]
+                            + 1) / other_frame_size)
+
+    return np.abs(centres[:, None] - other_centres[None, :]).argmin(axis=1)
+
+
+def filter_signal(fft_mags, frame, buffer, overlap, buffer_size, window,
+                  bars, gain_bins, gain_offsets, gains, adjustment,
+                  band_mags, cava_mem, noise_reduction, scale='linear', db_range=(-30., 40.),
+                  hops=1, rfft=np.fft.rfft, parallel=False):
+    # `hops` is number of buffers shifted into frame since the previous call
+    shift_frame(frame, buffer, overlap, buffer_size)
+    calc_spectrum(fft_mags, window, frame, rfft)
+    if scale == 'linear':
+        gather = gather_energy_parallel if parallel else gather_energy
+        gather(fft_mags, bars, gain_bins, gain_offsets, gains,
+               adjustment, band_mags, cava_mem, noise_reduction, hops)
+    else:
+        gather = gather_power_parallel if parallel else gather_power
+        gather(fft_mags, bars, gain_bins, gain_offsets, gains,
+               db_range[0], db_range[1], band_mags, cava_mem, noise_reduction, hops)
+
+
+def _gather_energy(fft_mags, bars, gain_bins, gain_offsets, gains,
+                   adjustment, band_mags, prev_mags, noise_reduction, hops=1):
+    # smoothing is rescaled to behave the same as if it ran once per hop,
+    # input is scaled as if it was integrated over all skipped hops
+    smoothing = noise_reduction ** hops
+    input_gain = (1 - smoothing) / (1 - noise_reduction)
 
     excess = 0
-    for n in range(bars):
-        band_mags[n] = prev_mags[n] * noise_reduction + band_mags[n]
+    for n in prange(bars):
+        energy = 0.
+        for k in range(gain_offsets[n], gain_offsets[n + 1]):
+            energy += fft_mags[gain_bins[k]] * gains[k]
+
+        band_mags[n] = energy
+        band_mags[n] *= adjustment[n]
+        band_mags[n] = prev_mags[n] * smoothing + band_mags[n] * input_gain
         prev_mags[n] = band_mags[n]
 
         diff = 1200 - band_mags[n]
         if (diff < 0):
             diff = 0
         div = 1 / (diff + 1)
-        prev_mags[n] = prev_mags[n] * (1 - div / 20)
+        prev_mags[n] = prev_mags[n] * (1 - div / 20) ** hops
 
         if (band_mags[n] > 1200):
-            excess = 1
+            excess += 1
         band_mags[n] /= 1200
 
     if excess:
-        adjustment *= 1 - 0.01
+        adjustment *= (1 - 0.01) ** hops
     else:
-        adjustment *= 1 + 0.001
+        adjustment *= (1 + 0.001) ** hops
+
+
+def _gather_power(fft_mags, bars, gain_bins, gain_offsets, gains,
+                  db_min, db_max, band_mags, prev_mags, noise_reduction, hops=1):
+    # log is taken per band only, never over the whole spectrum
+    smoothing = noise_reduction ** hops
+
+    for n in prange(bars):
+        power = 1e-20
+        for k in range(gain_offsets[n], gain_offsets[n + 1]):
+            power += fft_mags[gain_bins[k]] * fft_mags[gain_bins[k]] * gains[k]
+
+        level = (10. * np.log10(power) - db_min) / (db_max - db_min)
+        level = min(max(level, 0.), 1.)
+
+        # rise instantly, fall smoothly
+        if level < prev_mags[n]:
+            level = prev_mags[n] * smoothing + level * (1 - smoothing)
+        band_mags[n] = level
+        prev_mags[n] = level
+
+
+def _gather_energy_numpy(fft_mags, bars, gain_bins, gain_offsets, gains,
+                         adjustment, band_mags, prev_mags, noise_reduction, hops=1):
+    # the same steps as the loop above, intermediate values are kept in double
+    # precision as numba does for scalars
+    smoothing = noise_reduction ** hops
+    input_gain = (1 - smoothing) / (1 - noise_reduction)
+
+    band_mags[:] = np.add.reduceat(fft_mags[gain_bins] * gains, gain_offsets[:-1],
+                                   dtype=np.float64)
+    band_mags *= adjustment
+    mags = np.multiply(prev_mags, smoothing, dtype=np.float64)
+    mags += np.multiply(band_mags, input_gain, dtype=np.float64)
+    band_mags[:] = mags
+
+    diff = np.maximum(np.subtract(1200, band_mags, dtype=np.float64), 0)
+    prev_mags[:] = band_mags
+    prev_mags[:] = np.multiply(prev_mags, (1 - 1 / (diff + 1) / 20) ** hops, dtype=np.float64)
+
+    excess = (band_mags > 1200).any()
+    np.divide(band_mags, 1200, out=band_mags, dtype=np.float64)
+
+    rate = (1 - 0.01) ** hops if excess else (1 + 0.001) ** hops
+    np.multiply(adjustment, rate, out=adjustment, dtype=np.float64)
+
+
+def _gather_power_numpy(fft_mags, bars, gain_bins, gain_offsets, gains,
+                        db_min, db_max, band_mags, prev_mags, noise_reduction, hops=1):
+    smoothing = noise_reduction ** hops
+
+    mags = fft_mags[gain_bins]
+    power = np.add.reduceat(mags * mags * gains, gain_offsets[:-1], dtype=np.float64)
+    power += 1e-20
 
+    level = (10. * np.log10(power) - db_min) / (db_max - db_min)
+    np.clip(level, 0., 1., out=level)
 
-# dead_code
-@njit
-def calc_psd(fft_mags: np.ndarray, squared_window_sum: np.float64):
-    # power spectral density
-    fft_mags[:] = np.power(fft_mags * 2., 2) / squared_window_sum
+    # rise instantly, fall smoothly
+    fallen = np.multiply(prev_mags, smoothing, dtype=np.float64) + level * (1 - smoothing)
+    level = np.where(level < prev_mags, fallen, level)
+    band_mags[:] = level
+    prev_mags[:] = level
 
 
-# dead_code
-@njit
-def log_scale(fft_mags: np.ndarray, fft_weights: np.ndarray):
-    fft_mags[:] = 10. * np.log10(fft_mags) + fft_weights
+if jit_engine() == 'numba':
+    # bands are independent, parallel versions split them between threads
+    gather_energy = njit(_gather_energy)
+    gather_energy_parallel = njit(parallel=True)(_gather_energy)
+    gather_power = njit(_gather_power)
+    gather_power_parallel = njit(parallel=True)(_gather_power)
+else:
+    gather_energy = gather_energy_parallel = _gather_energy_numpy
+    gather_power = gather_power_parallel = _gather_power_numpy
@@ -0,0 +1,125 @@
+"""Adaptive quality: steps visuals and analysis down while they do not keep up
+with their budgets and back up when headroom returns
+
+Load is a share of budget taken by work: analysis of a hop against hop period
+and drawing of a frame against frame period. Levels are cumulative, every level
+keeps all reductions of the previous ones.
+"""
+
+
+LEVELS = ['full', 'half frame rate', 'coarse bands', 'no monstercat', 'small frame']
+HALF_FPS, COARSE_BANDS, NO_MONSTERCAT, SMALL_FRAME = range(1, len(LEVELS))
+
+# load thresholds to step down and up, the gap between them avoids flapping
+HIGH_LOAD = 0.8
+LOW_LOAD = 0.4
+# load has to stay beyond threshold that long before level changes, s
+DOWN_DELAY = 2.
+UP_DELAY = 10.
+# step up is delayed twice as long every time it has to be reverted
+MAX_UP_DELAY = 120.
+# how often loads are sampled, ms
+GOVERNOR_PERIOD = 500
+
+
+def coarser_distr(bands_distr: tuple[str, int]) -> tuple[str, int]:
+    """Half as many bands of the same distribution.
+    """
+    name, number = bands_distr
+    if name == 'octave':
+        return name, max(number // 2, 1)
+
+    return name, max(number // 2, 8)
+
+
+class LoadMeter:
+    """Accumulates time spent on work and its budget between samples.
+
+    It is fed by one thread and sampled by another, an update racing with
+    a sample is lost, which does not matter for an average.
+    """
+
+    def __init__(self):
+        self.busy = 0.
+        self.budget = 0.
+
+    def add(self, busy: float, budget: float):
+        self.busy += busy
+        self.budget += budget
+
+    def sample(self) -> float | None:
+        """Load since the previous sample, None if nothing was measured.
+        """
+        busy, budget = self.busy, self.budget
+        self.busy = self.budget = 0.
+        if not budget:
+            return None
+
+        return busy / budget
+
+
+class QualityGovernor:
+    """Chooses quality level from sampled loads with hysteresis.
+    """
+
+    def __init__(self, high: float = HIGH_LOAD, low: float = LOW_LOAD,
+                 down_delay: float = DOWN_DELAY, up_delay: float = UP_DELAY):
+        self.high = high
+        self.low = low
+        self.down_delay = down_delay
+        self.base_up_delay = up_delay
+        self.up_delay = up_delay
+
+        self.level = 0
+        self.max_level = len(LEVELS) - 1
+        self.load = 0.
+        self.pressure = 0
+        self.since = 0.
+        self.stepped_up = None
+
+    def update(self, loads: list[float | None], now: float) -> bool:
+        """Consumes sampled loads, returns whether level has changed.
+        """
+        loads = [load for load in loads if load is not None]
+        if not loads:
+            # nothing runs, e.g. while paused
+            self.pressure = 0
+            return False
+        self.load = max(loads)
+
+        pressure = 1 if self.load > self.high else -1 if self.load < self.low else 0
+        if pressure != self.pressure:
+            self.pressure = pressure
+            self.since = now
+            return False
+
+        if pressure > 0 and self.level < self.max_level and now - self.since >= self.down_delay:
+            if self.stepped_up is not None and now - self.stepped_up < self.up_delay:
+                # the last step up is reverted
+                self.up_delay = min(2 * self.up_delay, MAX_UP_DELAY)
+                self.stepped_up = None
+            self.level += 1
+            self.since = now
+            return True
+        if pressure < 0 and self.level > 0 and now - self.since >= self.up_delay:
+            if self.stepped_up is not None:
+                # the last step up held
+                self.up_delay = self.base_up_delay
+            self.level -= 1
+            self.since = now
+            self.stepped_up = now
+            return True
+
+        return False
+
+    def reject(self, level: int):
+        """Returns to `level` if the new one could not be taken, lower levels are
+        not tried again.
+        """
+        if self.level > level:
+            self.max_level = level
+        self.level = level
+
+    def describe(self) -> str:
+        return 'Quality level {}/{}: {} (load {:.0%})'.format(
+            self.level, len(LEVELS) - 1, LEVELS[self.level], self.load)
@@ -0,0 +1,154 @@
+"""Recording of band (and optionally spectrum) history to memory mapped file
+
+File layout (little-endian):
+
+    offset  type             field
+    0       char[4]          magic, b'AVZH'
+    4       uint32           layout version
+    8       uint32           bars number
+    12      uint32           spectrum size, 0 if spectrum is not recorded
+    16      uint64           number of recorded frames
+    24      char[40]         reserved
+    64      record[frames]   records
+
+    record:
+            float64          timestamp, seconds since the epoch
+            float32[bars]    band magnitudes
+            float32[size]    spectrum magnitudes
+
+File is preallocated and grows in the background, so writing a frame is a single
+copy into memory mapped file. Frames counter is updated after each record,
+so a file that is still being written (or was not closed properly) is readable.
+"""
+
+
+import os
+import threading
+import time
+
+import numpy as np
+
+
+MAGIC = b'AVZH'
+VERSION = 1
+HEADER_SIZE = 64
+# ~3 minutes of frames at 86 frames per second
+INITIAL_CAPACITY = 16384
+
+
+def record_dtype(bars: int, fft_size: int) -> np.dtype:
+    fields = [('timestamp', '<f8'), ('band_mags', '<f4', (bars,))]
+    if fft_size:
+        fields.append(('fft_mags', '<f4', (fft_size,)))
+    return np.dtype(fields)
+
+
+class HistoryWriter:
+    def __init__(self, path: str, bars: int, fft_size: int = 0,
+                 capacity: int = INITIAL_CAPACITY):
+        self.path = path
+        self.fft_size = fft_size
+        self.dtype = record_dtype(bars, fft_size)
+        self.count = 0
+        self.dropped = 0
+
+        with open(path, 'wb') as file:
+            file.write(MAGIC)
+            file.write(np.array([VERSION, bars, fft_size], dtype='<u4').tobytes())
+            file.truncate(HEADER_SIZE + capacity * self.dtype.itemsize)
+
+        self._header = np.memmap(path, dtype='<u8', mode='r+', offset=16, shape=(1,))
+        self.records = self._map(capacity)
+        # cleared while the file grows in the background
+        self._grown = threading.Event()
+        self._grown.set()
+
+    def _map(self, capacity: int) -> np.memmap:
+        return np.memmap(self.path, dtype=self.dtype, mode='r+',
+                         offset=HEADER_SIZE, shape=(capacity,))
+
+    def _grow(self, capacity: int):
+        with open(self.path, 'r+b') as file:
+            file.truncate(HEADER_SIZE + capacity * self.dtype.itemsize)
+        # mappings of the same file share pages, so swapping is safe
+        self.records = self._map(capacity)
+
+    def write(self, band_mags: np.ndarray, fft_mags: np.ndarray | None = None,
+              timestamp: float | None = None):
+        capacity = self.records.shape[0]
+        if self.count >= capacity:
+            # never wait for the file to grow
+            self.dropped += 1
+            return
+
+        record = self.records[self.count]
+        record['timestamp'] = time.time() if timestamp is None else timestamp
+        record['band_mags'] = band_mags
+        if fft_mags is not None:
+            record['fft_mags'] = fft_mags
+        self.count += 1
+        self._header[0] = self.count
+
+        if self.count >= capacity * 3 // 4 and self._grown.is_set():
+            self._grown.clear()
+            threading.Thread(target=self._grow_in_background, args=(capacity * 2,),
+                             daemon=True).start()
+
+    def _grow_in_background(self, capacity: int):
+        try:
+            self._grow(capacity)
+        finally:
+            self._grown.set()
+
+    def close(self):
+        self._grown.wait()
+        self.records.flush()
+        self._header.flush()
+        del self.records, self._header
+        # cut preallocated space
+        with open(self.path, 'r+b') as file:
+            file.truncate(HEADER_SIZE + self.count * self.dtype.itemsize)
+        if self.dropped:
+            print('History frames dropped while file was growing: {}'.format(self.dropped))
+
+
+class HistoryReader:
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            header = file.read(HEADER_SIZE)
+        if header[:4] != MAGIC:
+            raise ValueError('{} is not audioviz history file.'.format(path))
+        version, bars, fft_size = np.frombuffer(header, dtype='<u4', count=3, offset=4)
+        if version != VERSION:
+            raise ValueError('Unsupported history version: {}'.format(version))
+        count = int(np.frombuffer(header, dtype='<u8', count=1, offset=16)[0])
+
+        self.path = path
+        self.bars = int(bars)
+        self.fft_size = int(fft_size)
+        # frames counter might be behind the file size while it is being written
+        dtype = record_dtype(self.bars, self.fft_size)
+        count = min(count, (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize)
+        self.records = np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE,
+                                 shape=(count,)) if count else np.zeros(0, dtype=dtype)
+
+    def __len__(self) -> int:
+        return self.records.shape[0]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self.records['timestamp']
+
+    @property
+    def band_mags(self) -> np.ndarray:
+        return self.records['band_mags']
+
+    @property
+    def fft_mags(self) -> np.ndarray:
+        return self.records['fft_mags']
+
+    def frame_at(self, time_offset: float) -> int:
+        """Index of the frame shown `time_offset` seconds after the first one.
+        """
+        index = np.searchsorted(self.timestamps, self.timestamps[0] + time_offset, 'right')
+        return max(int(index) - 1, 0)
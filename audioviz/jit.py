@@ -0,0 +1,68 @@
+"""Selection of engine for analysis and drawing kernels
+
+Kernels are compiled by numba if it is installed, otherwise (or if disabled)
+vectorized numpy versions with the same results are used. Numba with llvmlite
+costs tens of megabytes of memory and seconds of start up, which might matter
+more than speed of kernels on thin clients.
+
+Engine is chosen once per process, before any module with kernels is imported.
+It is passed to worker processes via environment.
+"""
+
+
+import os
+from importlib.util import find_spec
+
+
+JIT_ENGINES = ['numba', 'numpy']
+ENVIRONMENT_VARIABLE = 'AUDIOVIZ_JIT'
+
+_engine = None
+
+
+def available_jit_engines() -> list[str]:
+    if find_spec('numba') is None:
+        return ['numpy']
+
+    return list(JIT_ENGINES)
+
+
+def select_jit(engine: str = 'auto') -> str:
+    """Chooses engine of kernels, 'auto' prefers numba if it is installed.
+    """
+    global _engine
+    if engine == 'auto':
+        engine = available_jit_engines()[0]
+    elif engine not in available_jit_engines():
+        raise ImportError('Jit engine {} is not installed.'.format(engine))
+
+    if _engine is not None and engine != _engine:
+        raise ValueError('Kernels are already loaded with {} engine.'.format(_engine))
+    _engine = engine
+    os.environ[ENVIRONMENT_VARIABLE] = engine
+
+    return engine
+
+
+def jit_engine() -> str:
+    """Engine of kernels, chosen from environment unless `select_jit` was called.
+    """
+    if _engine is None:
+        return select_jit(os.environ.get(ENVIRONMENT_VARIABLE, 'auto'))
+
+    return _engine
+
+
+def available_threads() -> int:
+    if jit_engine() != 'numba':
+        return 1
+
+    import numba
+    return numba.config.NUMBA_NUM_THREADS
+
+
+def set_threads(threads: int):
+    """Sets number of threads for parallel kernels launched from the calling thread.
+    """
+    import numba
+    numba.set_num_threads(threads)
@@ -0,0 +1,135 @@
+"""Headless rendering of bars into image surface
+"""
+
+
+import sys
+import threading
+import time
+from typing import BinaryIO
+
+import cairo
+import numpy as np
+
+from .draw import calc_flash_decay, clear, create_painter, paint_flash
+
+
+# used when size is set to screensize since there is no screen to measure
+DEFAULT_SIZE = (1920, 1080)
+
+
+class OffscreenRenderer:
+    """Renders the same visuals as `Renderer` into `cairo.ImageSurface`.
+
+    Frames can be streamed to `output` as raw RGBA bytes (premultiplied alpha),
+    e.g. `ffmpeg -f rawvideo -pix_fmt rgba -s WxH -r FPS -i - out.mp4`.
+    """
+
+    def __init__(self, config: dict, bars_num: int, output: BinaryIO | None = None):
+        self.fps = config['fps']
+        self.output = output
+
+        if config['size'] == 'screensize':
+            print('Size was set to screensize, offscreen size is forced to be {}, {}'.format(
+                *DEFAULT_SIZE), file=sys.stderr)
+            self.width, self.height = DEFAULT_SIZE
+        else:
+            self.width, self.height = config['size']
+
+        self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.width, self.height)
+        self.context = cairo.Context(self.surface)
+
+        self.painter = create_painter(config, bars_num)
+        self.painter.resize(self.width, self.height)
+        self.beat_flash = config['beat_flash']
+        self.flash_decay = calc_flash_decay(self.fps)
+        self.flash = 0.0
+
+        # ARGB32 is stored as native-endian 32-bit words
+        stride = self.surface.get_stride()
+        self.pixels = np.ndarray((self.height, stride // 4, 4), dtype=np.uint8,
+                                 buffer=self.surface.get_data())[:, :self.width]
+        self.channels = [2, 1, 0, 3] if sys.byteorder == 'little' else [1, 2, 3, 0]
+        self.frame = np.empty((self.height, self.width, 4), dtype=np.uint8)
+
+        self.recorder = None
+        self.subscriber = None
+        self.frames = 0
+        self.__running = threading.Event()
+
+    def render(self, band_mags: np.ndarray):
+        clear(self.context)
+        self.painter.push(band_mags)
+        self.painter.paint(self.context, band_mags)
+        if self.flash > 0.01:
+            paint_flash(self.context, self.flash)
+        self.flash *= self.flash_decay
+        self.surface.flush()
+
+    def rgba(self) -> np.ndarray:
+        np.take(self.pixels, self.channels, axis=2, out=self.frame)
+        return self.frame
+
+    def write_frame(self):
+        self.output.write(self.rgba().data)
+        self.frames += 1
+
+    def start(self, recorder):
+        self.recorder = recorder
+        self.subscriber = recorder.subscribe()
+        self.recorder.connect()
+        self.recorder.start()
+        self.__running.set()
+        print('Rendering {}x{} frames, press Ctrl+C to exit.'.format(self.width, self.height),
+              file=sys.stderr)
+
+        period = 1 / self.fps
+        deadline = time.perf_counter()
+        try:
+            while self.__running.is_set() and self.recorder.is_alive():
+                self.subscriber.poll()
+                if self.subscriber.beat:
+                    self.flash = self.beat_flash
+                self.render(self.subscriber.band_mags)
+                if self.output is not None:
+                    self.write_frame()
+
+                deadline += period
+                delay = deadline - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # do not try to catch up on missed frames
+                    deadline = time.perf_counter()
+        except (KeyboardInterrupt, BrokenPipeError):
+            pass
+        finally:
+            self.__running.clear()
+            self.recorder.stop()
+            self.recorder.join()
+            self.recorder.disconnect()
+
+    def replay(self, reader):
+        """Renders recorded history frame by frame as fast as possible.
+
+        Frames are sampled at the output frame rate, so the result is not affected
+        by how long rendering takes.
+        """
+        if not len(reader):
+            raise ValueError('History file {} has no frames.'.format(reader.path))
+
+        duration = reader.timestamps[-1] - reader.timestamps[0]
+        self.__running.set()
+        try:
+            for index in range(int(duration * self.fps) + 1):
+                if not self.__running.is_set():
+                    break
+                self.render(reader.band_mags[reader.frame_at(index / self.fps)])
+                if self.output is not None:
+                    self.write_frame()
+        except (KeyboardInterrupt, BrokenPipeError):
+            pass
+        finally:
+            self.__running.clear()
+
+    def stop(self):
+        self.__running.clear()
@@ -0,0 +1,56 @@
+"""Band plan: fft bounds of bands, their amplifier and analysis window
+
+Plans depend only on sample rate, frame size, bands distribution, frequency range
+and window type, so they are cached in memory and switching between layouts
+(e.g. by quality governor) does not compute them again. Computing a plan takes
+about a millisecond, which is less than reading it from a file.
+"""
+
+
+import functools
+
+import numpy as np
+
+from .filter import calc_band_bounds, calc_freq_amplifier
+
+
+PLAN_ARRAYS = ['fft_lower_bounds', 'fft_upper_bounds', 'amplifier', 'window']
+
+
+def calc_window(window_type: str, frame_size: int) -> np.ndarray:
+    if window_type == 'hanning':
+        return np.hanning(frame_size)
+    elif window_type == 'hamming':
+        return np.hamming(frame_size)
+    elif window_type == 'rectangle':
+        return np.ones(frame_size)
+
+    raise ValueError('Unknown window type: {}'.format(window_type))
+
+
+def calc_band_plan(bands_distr: tuple[str, int], sample_frequency: int, frame_size: int,
+                   freq_lower_bound: int, freq_upper_bound: int, window_type: str) -> dict:
+    fft_lower_bounds, fft_upper_bounds, bars = calc_band_bounds(
+        bands_distr, sample_frequency, frame_size, freq_lower_bound, freq_upper_bound)
+
+    return {
+        'fft_lower_bounds': fft_lower_bounds,
+        'fft_upper_bounds': fft_upper_bounds,
+        'bars': bars,
+        'amplifier': calc_freq_amplifier(bars, frame_size, freq_lower_bound, freq_upper_bound),
+        'window': calc_window(window_type, frame_size),
+    }
+
+
+@functools.lru_cache(maxsize=16)
+def load_band_plan(bands_distr: tuple[str, int], sample_frequency: int, frame_size: int,
+                   freq_lower_bound: int, freq_upper_bound: int, window_type: str) -> dict:
+    """Band plan from memory cache or computed anew.
+
+    Plans are shared between callers, so arrays are read only.
+    """
+    plan = calc_band_plan(bands_distr, sample_frequency, frame_size,
+                          freq_lower_bound, freq_upper_bound, window_type)
+    for name in PLAN_ARRAYS:
+        plan[name].flags.writeable = False
+    return plan
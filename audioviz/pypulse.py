@@ -11,6 +11,8 @@ from enum import Enum, unique
 
 
 _libpulse_simple = None
+# `(pa_usec_t) -1` is returned on errors
+PA_USEC_INVALID = 2 ** 64 - 1
 
 
 class PaSampleSpec(Structure):
@@ -192,7 +194,11 @@ def wrap_libpulse_simple():
     _libpulse_simple.pa_usec_to_bytes.restype = ctypes.c_size_t
 
 
-wrap_libpulse_simple()
+def _library() -> ctypes.CDLL:
+    # library is loaded on the first call, so importing the module is cheap
+    if _libpulse_simple is None:
+        wrap_libpulse_simple()
+    return _libpulse_simple
 
 
 def pa_simple_new(server: bytes | None, name: bytes, dir: PaStreamDirection,
@@ -233,8 +239,8 @@ def pa_simple_new(server: bytes | None, name: bytes, dir: PaStreamDirection,
         If failed to create stream
     """
     error = c_int(error)
-    connection = _libpulse_simple.pa_simple_new(server, name, dir.value, dev,
-                                                stream_name, ss, map, attr, error)
+    connection = _library().pa_simple_new(server, name, dir.value, dev,
+                                          stream_name, ss, map, attr, error)
     if not connection:
         raise Exception('Failed to create stream: {}'.format(error.value))
 
@@ -249,12 +255,12 @@ def pa_simple_free(s: int):
     s : int
         The connection object
     """
-    _libpulse_simple.pa_simple_free(s)
+    _library().pa_simple_free(s)
 
 
 def pa_simple_write(s: int, data: Array, bytes: int, error: int = 0):
     error = c_int(error)
-    ret = _libpulse_simple.pa_simple_write(s, data, bytes, error)
+    ret = _library().pa_simple_write(s, data, bytes, error)
 
     if ret < 0:
         raise Exception('Failed to write data to stream: {}'.format(error.value))
@@ -262,7 +268,7 @@ def pa_simple_write(s: int, data: Array, bytes: int, error: int = 0):
 
 def pa_simple_drain(s: int, error: int = 0):
     error = c_int(error)
-    ret = _libpulse_simple.pa_simple_drain(s, error)
+    ret = _library().pa_simple_drain(s, error)
 
     if ret < 0:
         raise Exception('Failed to drain stream data: {}'.format(error.value))
@@ -270,7 +276,7 @@ def pa_simple_drain(s: int, error: int = 0):
 
 def pa_simple_read(s: int, data: Array, bytes: int, error: int = 0):
     error = c_int(error)
-    ret = _libpulse_simple.pa_simple_read(s, data, bytes, error)
+    ret = _library().pa_simple_read(s, data, bytes, error)
 
     if ret < 0:
         raise Exception('Failed to read data from stream: {}'.format(error.value))
@@ -278,9 +284,9 @@ def pa_simple_read(s: int, data: Array, bytes: int, error: int = 0):
 
 def pa_simple_get_latency(s: int, error: int = 0) -> int:
     error = c_int(error)
-    latency = _libpulse_simple.pa_simple_get_latency(s, error)
+    latency = _library().pa_simple_get_latency(s, error)
 
-    if error == -1:
+    if latency == PA_USEC_INVALID:
         raise Exception('Failed to get latency: {}'.format(error.value))
 
     return latency
@@ -288,11 +294,11 @@ def pa_simple_get_latency(s: int, error: int = 0) -> int:
 
 def pa_simple_flush(s: int, error: int = 0):
     error = c_int(error)
-    ret = _libpulse_simple.pa_simple_flush(s, error)
+    ret = _library().pa_simple_flush(s, error)
 
     if ret < 0:
         raise Exception('Failed to flush buffer: {}'.format(error.value))
 
 
 def pa_usec_to_bytes(t: int, spec: PaSampleSpec):
-    return _libpulse_simple.pa_usec_to_bytes(t, spec)
+    return _library().pa_usec_to_bytes(t, spec)
@@ -1,17 +1,20 @@
 import ctypes
 import threading
+import time
 import warnings
 
 import numpy as np
 
-from .filter import (
-    calc_freq_amplifier, calc_logspace_fft_bounds, calc_octave_freq_bounds, filter_signal,
-    map_to_fft_bounds
-)
+from .analysis import Analyzer, calc_hops_per_analysis
+from .filter import calc_band_mapping
+from .governor import COARSE_BANDS, HALF_FPS, SMALL_FRAME, LoadMeter, coarser_distr
+from .history import HistoryReader, HistoryWriter
 from .pypulse import (
-    PaBufferAttr, PaChannelMap, PaSampleFormat, PaSampleSpec, PaStreamDirection, pa_simple_free,
-    pa_simple_get_latency, pa_simple_new, pa_simple_read, pa_usec_to_bytes
+    PaBufferAttr, PaChannelMap, PaSampleFormat, PaSampleSpec, PaStreamDirection, pa_simple_flush,
+    pa_simple_free, pa_simple_get_latency, pa_simple_new, pa_simple_read, pa_usec_to_bytes
 )
+from .sched import JitterMeter, apply_scheduling
+from .shm import BandPublisher
 
 
 def open_connection(name: str, stream_name: str, ss: PaSampleSpec,
@@ -79,20 +82,159 @@ def estimate_fragsize(dev: str | None, spec: PaSampleSpec, observations: int = 5
     return fragsize
 
 
-class Recorder(threading.Thread):
-    def __init__(self, config: dict):
+def create_source(config: dict, sample_format: PaSampleFormat):
+    if config['capture'] == 'apps':
+        from .streams import AppStreamsSource
+        return AppStreamsSource(config)
+
+    return PulseSource(config, sample_format)
+
+
+def create_recorder(config: dict):
+    if config['replay'] is not None:
+        return ReplayRecorder(config['replay'])
+    if config['isolation'] == 'process':
+        from .worker import ProcessRecorder
+        return ProcessRecorder(config)
+
+    return Recorder(config)
+
+
+class Subscriber:
+    """Conflated view of the latest frame published by recorder.
+
+    Frames are not queued, polling always yields the most recent one,
+    so each subscriber can run at its own rate.
+    """
+
+    def __init__(self, recorder: 'BaseRecorder'):
+        self.recorder = recorder
+        self.seq = 0
+        self.band_mags = np.zeros(recorder.num_bands())
+        self.beats = 0
+        self.beat = False
+
+    def poll(self) -> bool:
+        """Copies the latest frame into `band_mags`, returns whether it is a new one.
+
+        `beat` tells whether a beat happened since the previous poll.
+        """
+        seq = self.recorder.read_frame(self.band_mags, self.seq)
+        fresh = seq != self.seq
+        self.seq = seq
+
+        beats = self.recorder.beats
+        self.beat = beats != self.beats
+        self.beats = beats
+        return fresh
+
+
+class BaseRecorder(threading.Thread):
+    """Lifecycle, frame publication and callbacks shared by all band frame sources.
+    """
+
+    def __init__(self, bars: int):
         super().__init__()
-        self.connection = None
 
-        # pulse recorder
-        self.sample_format = PaSampleFormat.PA_SAMPLE_FLOAT32LE  # try PA_SAMPLE_S16LE
-        self.sample_frequency = config['frequency']
-        self.channels = config['channels']
+        # latest published frame for subscribers
+        self.frame_mags = np.ones(bars)
+        self.frame_seq = 0
+        self._frame_lock = threading.Lock()
+
+        self._callbacks = []
+        self._lock = threading.Lock()
 
+        # beats counter and tempo (bpm) estimate if beats are detected
+        self.beats = 0
+        self.tempo = 0.
+        self._beat_callbacks = []
+
+        self._running = threading.Event()
+        self._running.set()
+        self._unblock = threading.Event()
+        self._unblock.set()
+
+        # time spent on analysis against audio duration, watched by quality governor
+        self.load = LoadMeter()
+
+    def num_bands(self):
+        return self.frame_mags.size
+
+    def listening(self) -> bool:
+        """Whether anything is captured, sources of listened applications capture
+        nothing while none of them plays.
+        """
+        return True
+
+    def set_quality(self, level: int) -> bool:
+        """Trades analysis quality for speed, see `governor.LEVELS`.
+        Returns whether the level is taken, recorders without adjustable analysis
+        take any.
+        """
+        return True
+
+    def resume(self):
+        self._unblock.set()
+
+    def pause(self):
+        self._unblock.clear()
+
+    def stop(self):
+        self._unblock.set()
+        self._running.clear()
+
+    def add_callback(self, callback):
+        self._callbacks.append(callback)
+
+    def add_beat_callback(self, callback):
+        self._beat_callbacks.append(callback)
+
+    def subscribe(self) -> Subscriber:
+        return Subscriber(self)
+
+    def publish(self, band_mags: np.ndarray):
+        with self._frame_lock:
+            self.frame_mags[:] = band_mags
+            self.frame_seq += 1
+
+        # callbacks are never executed under the lock
+        for callback in self._callbacks:
+            callback()
+
+    def publish_beat(self, tempo: float):
+        self.tempo = tempo
+        self.beats += 1
+        for callback in self._beat_callbacks:
+            callback()
+
+    def read_frame(self, out: np.ndarray, seq: int = -1) -> int:
+        """Copies the latest frame into `out` unless it was seen, returns its sequence.
+        """
+        with self._frame_lock:
+            if self.frame_seq != seq:
+                out[:] = self.frame_mags
+            return self.frame_seq
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+
+class PulseSource:
+    """Captures audio from PulseAudio device (or its monitor) via simple API.
+
+    Sources fill buffers of samples in recorder thread, any object with
+    `open`, `read`, `latency`, `flush` and `close` methods can be used instead.
+    """
+
+    def __init__(self, config: dict, sample_format: PaSampleFormat):
+        self.connection = None
         self.pulse_config = {
             'name': 'audioviz-app',
             'stream_name': 'audio-recorder',
-            'ss': PaSampleSpec(self.sample_format.value, self.sample_frequency, self.channels),
+            'ss': PaSampleSpec(sample_format.value, config['frequency'], config['channels']),
             'server': None,
             'dev': None if config['device'] == 'None' else config['device'],
             'map': None,
@@ -105,105 +247,312 @@ class Recorder(threading.Thread):
                                                  prebuf=-1, minreq=-1,
                                                  fragsize=fragsize)
 
-        # signal processing
-        frame_size = config['frame_size']
-        self.buffer_size = config['buffer_size']
-        # self.weighting_type = config['weighting_type']
-        self.window = None
-
-        # precalculations
-        self.overlap = frame_size - self.buffer_size
-        if config['window_type'] == 'hanning':
-            self.window = np.hanning(frame_size)
-        elif config['window_type'] == 'hamming':
-            self.window = np.hamming(frame_size)
-        elif config['window_type'] == 'rectangle':
-            self.window = np.ones(frame_size)
-
-        fft_freqs = np.fft.rfftfreq(frame_size, 1.0 / self.sample_frequency)
-        fft_size = fft_freqs.size
-        freq_lower_bound = config['lower_freq']
-        freq_upper_bound = config['upper_freq']
-
-        if config['bands_distr'][0] == 'octave':
-            oct_freq_lower_bounds, oct_freq_upper_bounds = calc_octave_freq_bounds(
-                config['bands_distr'][1], freq_lower_bound, freq_upper_bound
-            )
-            self.fft_lower_bounds, self.fft_upper_bounds = map_to_fft_bounds(
-                oct_freq_lower_bounds, oct_freq_upper_bounds, fft_size
-            )
-            self.bars = self.fft_lower_bounds.size
-        elif config['bands_distr'][0] == 'logspace':
-            self.bars = config['bands_distr'][1]
-            self.fft_lower_bounds, self.fft_upper_bounds = calc_logspace_fft_bounds(
-                self.sample_frequency, self.bars, frame_size, freq_lower_bound, freq_upper_bound
-            )
+    def open(self):
+        self.connection = open_connection(**self.pulse_config)
+        print('Connection established')
 
-        self.adjustment = np.ones(self.bars)
-        self.noise_reduction = config['noise_reduction']
-        self.amplifier = calc_freq_amplifier(
-            self.bars, frame_size, freq_lower_bound, freq_upper_bound
-        )
+    def read(self, buffer: ctypes.Array):
+        fill_buffer(self.connection, buffer)
 
-        # create buffers
-        self.buffer = make_buffer(self.sample_format, self.buffer_size)
-        self.frame = np.zeros(frame_size, dtype='f')
-        self.fft_mags = np.zeros(fft_size, dtype=np.float64)
-        self.prev_mags = np.zeros(self.bars, dtype=np.float64)
-        self.band_mags = np.ones(self.bars)
+    def latency(self) -> float:
+        """Seconds of captured audio waiting to be read, including device latency.
+        """
+        return pa_simple_get_latency(self.connection) / 1e6
 
-        self._callbacks = []
-        self._lock = threading.Lock()
-        self.__running = threading.Event()
-        self.__running.set()
-        self.__unblock = threading.Event()
-        self.__unblock.set()
+    def flush(self):
+        pa_simple_flush(self.connection)
+
+    def close(self):
+        close_connection(self.connection)
+        self.connection = None
+        print('Connection closed')
 
-    def num_bands(self):
-        return self.band_mags.size
+
+class Recorder(BaseRecorder):
+    def __init__(self, config: dict, source=None):
+        self.connected = False
+
+        # pulse recorder
+        self.sample_format = PaSampleFormat.PA_SAMPLE_FLOAT32LE  # try PA_SAMPLE_S16LE
+        self.sample_frequency = config['frequency']
+        self.channels = config['channels']
+        if source is None:
+            source = create_source(config, self.sample_format)
+        self.source = source
+
+        # signal processing
+        self.config = config
+        self.analyzer = Analyzer(config)
+        self.buffer_size = self.analyzer.buffer_size
+        self.bars = self.analyzer.bars
+        self.band_mags = self.analyzer.band_mags
+        # bands of analysis with reduced quality are mapped to published bars
+        self.band_layout = (self.analyzer.fft_lower_bounds, self.analyzer.fft_upper_bounds,
+                            self.bars, config['frame_size'])
+        self.band_mapping = None
+        self.mapped_mags = np.zeros(self.bars, dtype=self.analyzer.dtype)
+        self.quality = 0
+
+        self.buffer = make_buffer(self.sample_format, self.buffer_size)
+
+        super().__init__(self.bars)
+
+        self.publisher = None
+        if config['shared_memory'] is not None:
+            self.publisher = BandPublisher(config['shared_memory'], self.bars)
+            self.add_callback(self.publish_shared)
+            self.add_beat_callback(self.publish_shared_beat)
+
+        self.history = None
+        if config['history'] is not None:
+            fft_size = self.analyzer.fft_mags.size if config['history_spectrum'] else 0
+            self.history = HistoryWriter(config['history'], self.bars, fft_size)
+            self.add_callback(self.record_history)
+
+        # overruns: capture is ahead of processing
+        self.overrun_policy = config['overrun']
+        self.hop_period = self.buffer_size / self.sample_frequency
+        self.hop_rate = int(1 / self.hop_period)
+        # a hop of analysis may take several hops of capture, it is not an overrun
+        self.backlog_tolerance = self.analyzer.hops_per_analysis + 1
+        # policies never act on more than a second of hops, larger backlog
+        # is caught up with over the next hops
+        self.backlog_limit = self.hop_rate
+        self.base_latency = 0.
+        self.base_hops_per_analysis = self.analyzer.hops_per_analysis
+        self.hops_since_change = 0
+        self.hops_since_overrun = 0
+
+        self.overruns = 0
+        self.dropped_hops = 0
+        self.batched_hops = 0
+        self.max_backlog = 0
+
+        # scheduling of this thread, applied once it runs
+        self.scheduling = (config['affinity'], config['scheduling'], config['priority'],
+                           config['niceness'])
+        self.jitter = JitterMeter(self.hop_period)
 
     def run(self):
+        apply_scheduling(*self.scheduling)
         try:
-            while self.__running.is_set():
-                self.__unblock.wait()
+            while self._running.is_set():
+                if not self._unblock.is_set():
+                    self._unblock.wait()
+                    self.jitter.reset()
+                    # audio queued while paused is stale
+                    if self._running.is_set():
+                        self.source.flush()
                 with self._lock:
-                    fill_buffer(self.connection, self.buffer)
-                    filter_signal(self.fft_mags, self.frame, self.buffer, self.overlap,
-                                  self.buffer_size, self.window, self.bars,
-                                  self.fft_lower_bounds, self.fft_upper_bounds,
-                                  self.adjustment, self.amplifier,
-                                  self.band_mags, self.prev_mags, self.noise_reduction)
-
-                    for callback in self._callbacks:
-                        callback()
+                    started = time.perf_counter()
+                    self.source.read(self.buffer)
+                    self.jitter.tick(time.perf_counter())
+                    # read did not wait for audio, so it was already queued
+                    if time.perf_counter() - started < self.hop_period / 2:
+                        self.check_backlog()
+                    self.hops_since_change += 1
+                    self.hops_since_overrun += 1
+                    if (self.analyzer.hops_per_analysis > self.base_hops_per_analysis
+                            and min(self.hops_since_change, self.hops_since_overrun)
+                            > 2 * self.hop_rate):
+                        self.restore()
+
+                    processing = time.perf_counter()
+                    analysed = self.analyzer.process(self.buffer)
+                    self.load.add(time.perf_counter() - processing, self.hop_period)
+                    if not analysed:
+                        continue
+                    if self.band_mapping is not None:
+                        np.take(self.analyzer.band_mags, self.band_mapping, out=self.band_mags)
+
+                self.publish(self.band_mags)
+                if self.analyzer.beat:
+                    self.publish_beat(self.analyzer.beats.tempo)
         except Exception as ex:
             self.disconnect()
             raise ex
 
-    def resume(self):
-        self.__unblock.set()
+    def check_backlog(self):
+        backlog = min(int(max(self.source.latency() - self.base_latency, 0) / self.hop_period),
+                      self.backlog_limit)
+        self.max_backlog = max(self.max_backlog, backlog)
+        if backlog <= self.backlog_tolerance:
+            return
+
+        self.overruns += 1
+        self.hops_since_overrun = 0
+        if self.overruns == 1 or not self.overruns % 100:
+            print('Capture overrun #{}: {} hops behind'.format(self.overruns, backlog))
+
+        match self.overrun_policy:
+            case 'drop':
+                # bars resync with what is playing now
+                self.source.flush()
+                self.dropped_hops += backlog
+            case 'batch':
+                # queued hops do not block, they are analysed at once with the last one
+                for _ in range(backlog):
+                    self.analyzer.skip(self.buffer)
+                    self.source.read(self.buffer)
+                self.batched_hops += backlog
+            case 'degrade':
+                # analyse less often, at most one step per second
+                if self.hops_since_change >= self.hop_rate:
+                    self.analyzer.hops_per_analysis = min(
+                        2 * self.analyzer.hops_per_analysis,
+                        max(self.hop_rate // 5, self.base_hops_per_analysis))
+                    self.backlog_tolerance = self.analyzer.hops_per_analysis + 1
+                    self.hops_since_change = 0
+
+    def set_quality(self, level: int) -> bool:
+        """Trades analysis quality for speed, see `governor.LEVELS`, returns
+        whether analysis could be changed.
+
+        Number of published bars stays the same, bands of coarser analysis are
+        repeated. Autogain and beats state start over if bands change.
+        """
+        config = dict(self.config)
+        if level >= HALF_FPS:
+            config['windows'] = [dict(window, fps=max(window['fps'] // 2, 1))
+                                 for window in config['windows']]
+        if level >= COARSE_BANDS:
+            config['bands_distr'] = coarser_distr(config['bands_distr'])
+        # recorded spectrum keeps its size
+        if (level >= SMALL_FRAME and config['frame_size'] >= 4 * self.buffer_size
+                and (self.history is None or not self.history.fft_size)):
+            config['frame_size'] //= 2
+
+        hops_per_analysis = calc_hops_per_analysis(
+            self.sample_frequency / self.buffer_size,
+            max(window['fps'] for window in config['windows']), config['analysis_rate'])
+        analyzer = self.analyzer
+        if (config['bands_distr'] != analyzer.bands_distr
+                or config['frame_size'] != analyzer.frame.size):
+            try:
+                analyzer = Analyzer(config)
+            except ValueError as ex:
+                print('Analysis is not changed: {}'.format(ex))
+                return False
+            # the latest samples are carried over, so spectrum does not start from silence
+            size = min(analyzer.frame.size, self.analyzer.frame.size)
+            analyzer.frame[-size:] = self.analyzer.frame[-size:]
+
+        if analyzer.bars == self.bars and analyzer.frame.size == self.config['frame_size']:
+            band_mapping = None
+            band_mags = analyzer.band_mags
+        else:
+            band_mapping = calc_band_mapping(
+                *self.band_layout, analyzer.fft_lower_bounds, analyzer.fft_upper_bounds,
+                analyzer.bars, analyzer.frame.size)
+            band_mags = self.mapped_mags
+
+        with self._lock:
+            # `degrade` overrun policy keeps analysing less often
+            analyzer.hops_per_analysis = max(
+                hops_per_analysis,
+                self.analyzer.hops_per_analysis // self.base_hops_per_analysis
+                * hops_per_analysis)
+            self.base_hops_per_analysis = hops_per_analysis
+            self.backlog_tolerance = analyzer.hops_per_analysis + 1
+            self.analyzer = analyzer
+            self.band_mapping = band_mapping
+            self.band_mags = band_mags
+            self.quality = level
+        return True
+
+    def restore(self):
+        self.analyzer.hops_per_analysis = max(self.analyzer.hops_per_analysis // 2,
+                                              self.base_hops_per_analysis)
+        self.backlog_tolerance = self.analyzer.hops_per_analysis + 1
+        self.hops_since_change = 0
+
+    def listening(self) -> bool:
+        # only sources of listened applications track what plays
+        streams = getattr(self.source, 'streams', None)
+        return streams is None or len(streams) > 0
+
+    def stats(self) -> dict:
+        return {
+            'overruns': self.overruns,
+            'dropped_hops': self.dropped_hops,
+            'batched_hops': self.batched_hops,
+            'max_backlog': self.max_backlog,
+            'hops_per_analysis': self.analyzer.hops_per_analysis,
+            'quality': self.quality,
+            **self.jitter.stats(),
+        }
 
-    def pause(self):
-        self.__unblock.clear()
+    def publish_shared(self):
+        # executed in recorder thread, so `band_mags` is not modified meanwhile
+        self.publisher.publish(self.band_mags)
 
-    def stop(self):
-        self.__unblock.set()
-        self.__running.clear()
+    def publish_shared_beat(self):
+        self.publisher.publish_beat()
 
-    def add_callback(self, callback):
-        self._callbacks.append(callback)
+    def record_history(self):
+        self.history.write(self.band_mags,
+                           self.analyzer.fft_mags if self.history.fft_size else None)
 
     def connect(self):
-        self.connection = open_connection(**self.pulse_config)
-        print('Connection established')
+        self.source.open()
+        self.connected = True
 
         # jit cache warm-up
-        fill_buffer(self.connection, self.buffer)
-        filter_signal(self.fft_mags, self.frame, self.buffer, self.overlap, self.buffer_size,
-                      self.window, self.bars, self.fft_lower_bounds, self.fft_upper_bounds,
-                      self.adjustment, self.amplifier,
-                      self.band_mags, self.prev_mags, self.noise_reduction)
+        self.source.read(self.buffer)
+        self.analyzer.warm_up(self.buffer)
+
+        # audio queued during warm-up is stale, the rest is latency of device
+        self.source.flush()
+        self.source.read(self.buffer)
+        self.base_latency = self.source.latency()
 
     def disconnect(self):
-        close_connection(self.connection)
-        print('Connection closed')
+        if not self.connected:
+            return
+
+        self.source.close()
+        self.connected = False
+        if self.overruns:
+            print('Capture overruns: {overruns}, hops dropped: {dropped_hops}, '
+                  'hops batched: {batched_hops}, max backlog: {max_backlog} hops'.format(
+                      **self.stats()))
+        if self.jitter.count:
+            print('Hop jitter: mean {jitter_mean:.2f} ms, p99 {jitter_p99:.2f} ms, '
+                  'max {jitter_max:.2f} ms'.format(**self.jitter.stats()))
+        if self.publisher is not None:
+            self.publisher.close()
+        if self.history is not None:
+            self.history.close()
+
+
+class ReplayRecorder(BaseRecorder):
+    """Publishes recorded frames with the original timing instead of live capture.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.reader = HistoryReader(path)
+        if not len(self.reader):
+            raise ValueError('History file {} has no frames.'.format(path))
+        super().__init__(self.reader.bars)
+        self.speed = speed
+        self.band_mags = np.zeros(self.reader.bars)
+
+    def run(self):
+        timestamps = self.reader.timestamps
+        start = time.perf_counter()
+        for index in range(len(self.reader)):
+            if not self._unblock.is_set():
+                paused_at = time.perf_counter()
+                self._unblock.wait()
+                start += time.perf_counter() - paused_at
+
+            target = (timestamps[index] - timestamps[0]) / self.speed
+            while self._running.is_set() and time.perf_counter() - start < target:
+                time.sleep(min(target - (time.perf_counter() - start), 0.05))
+            if not self._running.is_set():
+                break
+
+            self.band_mags[:] = self.reader.band_mags[index]
+            self.publish(self.band_mags)
+
+        print('Replay finished')
@@ -2,50 +2,69 @@ import time
 
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import GLib, Gtk, Gdk
+from gi.repository import GLib, Gtk, Gdk, Gio
 
 import cairo
 import numpy as np
 import pulsectl
 
-from .effect import monstercat
-from .record import Recorder
+from .draw import calc_flash_decay, clear, create_painter, paint_flash, union_rect
+from .governor import GOVERNOR_PERIOD, HALF_FPS, NO_MONSTERCAT, LoadMeter, QualityGovernor
+from .record import Recorder, create_recorder
 
 
-class Renderer:
-    def __init__(self, config: dict):
-        self.recorder = Recorder(config)
-        self.recorder.add_callback(self.transfer_data)
-        self.pulse = None
+# screen lock (or blanking) signals of different desktop environments
+SCREENSAVER_INTERFACES = ['org.freedesktop.ScreenSaver', 'org.gnome.ScreenSaver']
 
-        self.fps = config['fps']
 
-        self.renderer_active = True
-        self.listen_apps = config['apps']
+class Renderer:
+    """Visualizer window drawing bars from a (possibly shared) recorder.
+    """
+
+    def __init__(self, config: dict, recorder: Recorder, on_close=None, on_visibility=None):
+        self.recorder = recorder
+        self.subscriber = recorder.subscribe()
+        self.on_close = on_close
+        self.on_visibility = on_visibility
 
-        # bars
-        self.bars_num = self.recorder.num_bands()
-        self.bars_color = Gdk.RGBA(*config['color'])
-        self.bars_padding = config['padding']
-        self.right_offset = config['right_offset']
-        self.bot_offset = config['bot_offset']
-        self.left_offset = config['left_offset']
-        self.top_offset = config['top_offset']
+        self.fps = config['fps']
+        self.base_fps = config['fps']
+        self.base_monstercat = config['monstercat']
+        # time spent on drawing against frame period, watched by quality governor
+        self.load = LoadMeter()
 
-        self.rotation = config['rotation']
+        # bars or waterfall
+        self.painter = create_painter(config, self.recorder.num_bands())
+        self.beat_flash = config['beat_flash']
+        self.flash_decay = calc_flash_decay(self.fps)
+        self.flash = 0.0
 
         # initial value and on pause
         self.mag_min = 0.01
 
-        self.band_mags = np.full(self.recorder.num_bands(),
-                                 self.mag_min, dtype=np.float64)
+        self.idle_mags = np.full(self.recorder.num_bands(), self.mag_min, dtype=np.float64)
+        self.band_mags = self.idle_mags
+
+        # part of the window covered by bars of the last drawn frame, only it and
+        # bars of a new frame are redrawn and composited
+        self.damaged = (0, 0, 0, 0)
+        self.damaged_area = 0
+        self.frames = 0
 
         # window
         self.window = Gtk.Window()
         self.window.set_type_hint(Gdk.WindowTypeHint.DESKTOP)
         screen = self.window.get_screen()
-        mon_geom = screen.get_display().get_primary_monitor().get_geometry()
-        screen_size = [mon_geom.width - mon_geom.x, mon_geom.height - mon_geom.y]
+        display = screen.get_display()
+        if config['monitor'] == 'primary':
+            monitor = display.get_primary_monitor()
+        else:
+            monitor = display.get_monitor(config['monitor'])
+            if monitor is None:
+                print('Monitor {} is not found, falling to primary.'.format(config['monitor']))
+                monitor = display.get_primary_monitor()
+        mon_geom = monitor.get_geometry()
+        screen_size = [mon_geom.width, mon_geom.height]
         if config['size'] != 'screensize':
             width, height = config['size']
             if width > screen_size[0]:
@@ -65,9 +84,10 @@ class Renderer:
                 pos_y = screen_size[1] - height
 
             self.window.set_default_size(width, height)
-            self.window.move(pos_x, pos_y)
+            self.window.move(mon_geom.x + pos_x, mon_geom.y + pos_y)
         else:
             self.window.set_default_size(*screen_size)
+            self.window.move(mon_geom.x, mon_geom.y)
 
         # set window transparent
         self.window.set_app_paintable(True)
@@ -79,135 +99,279 @@ class Renderer:
         self.draw_area.connect("draw", self.render_bars)
         self.window.add(self.draw_area)
 
-        if self.listen_apps:
-            GLib.timeout_add(1000 / self.fps, self.on_update_with_source)
-        else:
-            GLib.timeout_add(1000 / self.fps, self.on_update)
+        self.timer = GLib.timeout_add(1000 / self.fps, self.on_update)
         self.window.connect("check-resize", self.on_resize)
         self.window.connect("key-press-event", self.check_escape)
-        self.window.connect("destroy", self.stop)
+        self.window.connect("destroy", self.close)
+
+        # desktop window is covered by other windows most of the time
+        self.suspend_hidden = config['suspend_hidden']
+        self.visible = True
+        self.obscured = False
+        self.iconified = False
+        if self.suspend_hidden:
+            self.window.add_events(Gdk.EventMask.VISIBILITY_NOTIFY_MASK)
+            self.window.connect("visibility-notify-event", self.on_visibility_notify)
+            self.window.connect("window-state-event", self.on_window_state)
 
         # self.fps_monitor = time.time()
 
         self.window.show_all()
 
     def transparent_bckg(self, widget, cr):
-        cr.set_source_rgba(1.0, 1.0, 1.0, 0.0)
-        cr.set_operator(cairo.OPERATOR_SOURCE)
-        cr.paint()
+        clear(cr)
 
         return False
 
-    def transfer_data(self):
-        self.band_mags = self.recorder.band_mags
-
     def on_update(self):
-        self.draw_area.queue_draw()
+        # redraw only when recorder published a new frame since the last update
+        fresh = self.subscriber.poll()
+        if fresh:
+            self.band_mags = self.subscriber.band_mags
+            self.painter.push(self.band_mags)
+
+        if self.beat_flash:
+            if self.subscriber.beat:
+                self.flash = self.beat_flash
+                fresh = True
+            elif self.flash:
+                self.flash = self.flash * self.flash_decay if self.flash > 0.01 else 0.0
+                fresh = True
+
+        if fresh:
+            damaged = self.painter.damage(self.band_mags)
+            x, y, width, height = union_rect(self.damaged, damaged)
+            self.damaged = damaged
+            self.damaged_area += width * height
+            self.frames += 1
+            self.draw_area.queue_draw_area(x, y, width, height)
         return True
 
-    def on_update_with_source(self):
-        # increases CPU usage by 2% compared to simple `on_update`
-        corked = True
-        for source in self.pulse.sink_input_list():
-            if source.proplist['application.name'] in self.listen_apps:
-                corked &= source.corked
+    def on_visibility_notify(self, widget, event):
+        self.obscured = event.state == Gdk.VisibilityState.FULLY_OBSCURED
+        self.update_visibility()
+        return False
 
-        if corked:
-            if self.renderer_active:
-                self.recorder.pause()
-                time.sleep(0.1)
-                self.band_mags.fill(self.mag_min)
-                self.draw_area.queue_draw()
-                self.renderer_active = False
-        else:
-            if not self.renderer_active:
-                self.recorder.resume()
-                self.renderer_active = True
-            self.draw_area.queue_draw()
+    def on_window_state(self, widget, event):
+        self.iconified = bool(event.new_window_state & (Gdk.WindowState.ICONIFIED
+                                                        | Gdk.WindowState.WITHDRAWN))
+        self.update_visibility()
+        return False
 
-        return True
+    def update_visibility(self):
+        visible = not self.obscured and not self.iconified
+        if visible == self.visible:
+            return
+        self.visible = visible
 
-    def on_resize(self, *args):
-        if self.rotation == 0:
-            self.bars_start_pos = self.draw_area.get_allocated_height() - self.bot_offset
-            self.bars_max_height = self.bars_start_pos - self.top_offset
-
-            total_bars_width = (self.draw_area.get_allocated_width()
-                                - self.right_offset - self.left_offset) \
-                - self.bars_padding * (self.bars_num - 1)
-            self.bar_width = max(int(total_bars_width / self.bars_num), 1)
-        elif self.rotation == 90:
-            self.bars_start_pos = self.draw_area.get_allocated_width() - self.right_offset
-            self.bars_max_height = self.bars_start_pos - self.left_offset
-
-            total_bars_width = (self.draw_area.get_allocated_height()
-                                - self.bot_offset - self.top_offset) \
-                - self.bars_padding * (self.bars_num - 1)
-            self.bar_width = max(int(total_bars_width / self.bars_num), 1)
-        elif self.rotation == 180:
-            self.bars_start_pos = self.top_offset
-            self.bars_max_height = self.draw_area.get_allocated_height() - self.bot_offset
-
-            total_bars_width = (self.draw_area.get_allocated_width()
-                                - self.right_offset - self.left_offset) \
-                - self.bars_padding * (self.bars_num - 1)
-            self.bar_width = max(int(total_bars_width / self.bars_num), 1)
+        # nothing is drawn while hidden, so redraws are not even scheduled
+        if visible:
+            self.timer = GLib.timeout_add(1000 / self.fps, self.on_update)
+            self.draw_area.queue_draw()
         else:
-            self.bars_start_pos = self.left_offset
-            self.bars_max_height = self.draw_area.get_allocated_width() - self.right_offset
+            GLib.source_remove(self.timer)
+            self.timer = None
+        if self.on_visibility is not None:
+            self.on_visibility()
+
+    def reset(self):
+        self.band_mags = self.idle_mags
+        self.painter.push(self.band_mags)
+        self.draw_area.queue_draw()
 
-            total_bars_width = (self.draw_area.get_allocated_height()
-                                - self.bot_offset - self.top_offset) \
-                - self.bars_padding * (self.bars_num - 1)
-            self.bar_width = max(int(total_bars_width / self.bars_num), 1)
+    def on_resize(self, *args):
+        self.painter.resize(self.draw_area.get_allocated_width(),
+                            self.draw_area.get_allocated_height())
+        # clicks outside of bars go to the desktop
+        bounds = self.painter.bounds()
+        self.window.input_shape_combine_region(cairo.Region(cairo.RectangleInt(*bounds)))
+        self.damaged = bounds
+
+    def report(self):
+        """Prints average share of the window redrawn per frame.
+        """
+        window_area = self.draw_area.get_allocated_width() * self.draw_area.get_allocated_height()
+        if not self.frames or not window_area:
+            return
+        print('Redrawn area per frame: {:.1f}% of window'.format(
+            100 * self.damaged_area / self.frames / window_area))
 
     def render_bars(self, widget, cr):
         # delta = time.time() - self.fps_monitor
         # print('FPS:', 1 / delta)
         # self.fps_monitor = time.time()
-        cr.set_source_rgba(*self.bars_color)
-
-        heights = self.bars_max_height * self.band_mags
-        monstercat(heights)
-
-        if self.rotation == 0:
-            dx = self.left_offset
-            for height in heights:
-                cr.rectangle(dx, self.bars_start_pos, self.bar_width, -height)
-                dx += self.bar_width + self.bars_padding
-        elif self.rotation == 90:
-            dy = self.draw_area.get_allocated_height() - self.bot_offset
-            for height in heights:
-                cr.rectangle(self.bars_start_pos, dy, -height, -self.bar_width)
-                dy -= self.bar_width + self.bars_padding
-        elif self.rotation == 180:
-            dx = self.draw_area.get_allocated_width() - self.right_offset
-            for height in heights:
-                cr.rectangle(dx, self.bars_start_pos, -self.bar_width, height)
-                dx -= self.bar_width + self.bars_padding
+        started = time.perf_counter()
+        self.painter.paint(cr, self.band_mags)
+        if self.flash:
+            paint_flash(cr, self.flash)
+        self.load.add(time.perf_counter() - started, 1 / self.fps)
+
+    def set_quality(self, level: int):
+        """Trades drawing quality for speed, see `governor.LEVELS`.
+        """
+        fps = max(self.base_fps // 2, 1) if level >= HALF_FPS else self.base_fps
+        if fps != self.fps:
+            self.fps = fps
+            self.flash_decay = calc_flash_decay(fps)
+            # hidden window has no timer, it is started with the new rate once shown
+            if self.timer is not None:
+                GLib.source_remove(self.timer)
+                self.timer = GLib.timeout_add(1000 / self.fps, self.on_update)
+        if hasattr(self.painter, 'monstercat'):
+            self.painter.monstercat = None if level >= NO_MONSTERCAT else self.base_monstercat
+
+    def close(self, *args):
+        if self.on_close is not None:
+            self.on_close()
+
+    def check_escape(self, widget, event):
+        if event.keyval == Gdk.KEY_Escape:
+            self.close()
+            return True
+        return False
+
+
+class Visualizer:
+    """Runs one analysis engine feeding any number of renderer windows.
+    """
+
+    def __init__(self, config: dict):
+        self.recorder = create_recorder(config)
+        self.pulse = None
+        self.running = False
+
+        # recorder runs only if some window is visible and listened apps are playing
+        self.active = True
+        self.capturing = True
+        self.corked = False
+        self.screen_locked = False
+        self.suspend_hidden = config['suspend_hidden']
+        self.listen_apps = config['apps']
+        # source of listened applications tracks them itself and keeps tracking
+        # only while recorder runs
+        self.capture_apps = config['capture'] == 'apps'
+
+        self.renderers = []
+        for window_config in config['windows']:
+            self.renderers.append(Renderer(window_config, self.recorder, self.stop,
+                                           self.update_activity))
+
+        # visuals and analysis step down while they do not keep up
+        self.governor = None
+        if config['adaptive_quality']:
+            self.governor = QualityGovernor()
+            GLib.timeout_add(GOVERNOR_PERIOD, self.govern)
+
+        # recorded frames do not depend on what is playing now
+        self.check_sources = self.listen_apps and config['replay'] is None
+        if self.check_sources and self.capture_apps:
+            GLib.timeout_add(500, self.check_streams)
+        elif self.check_sources:
+            GLib.timeout_add(1000 / config['fps'], self.on_update_with_source)
+        GLib.timeout_add(500, self.check_recorder)
+        if self.suspend_hidden:
+            self.watch_screensaver()
+
+    def watch_screensaver(self):
+        try:
+            bus = Gio.bus_get_sync(Gio.BusType.SESSION, None)
+        except GLib.Error as ex:
+            print('Screen locking is not tracked: {}'.format(ex.message))
+            return
+
+        for interface in SCREENSAVER_INTERFACES:
+            bus.signal_subscribe(None, interface, 'ActiveChanged', None, None,
+                                 Gio.DBusSignalFlags.NONE, self.on_screensaver)
+
+    def on_screensaver(self, connection, sender, path, interface, signal, parameters):
+        self.screen_locked = parameters.unpack()[0]
+        self.update_activity()
+
+    def update_activity(self):
+        visible = not self.suspend_hidden or (
+            not self.screen_locked and any(renderer.visible for renderer in self.renderers))
+        self.active = visible and not self.corked
+        # silent listened applications are tracked by recorder, so it keeps running
+        # and bars fall down with silence
+        capturing = visible and (not self.corked or self.capture_apps)
+        if capturing == self.capturing:
+            return
+        self.capturing = capturing
+
+        if capturing:
+            self.recorder.resume()
         else:
-            dy = self.top_offset
-            for height in heights:
-                cr.rectangle(self.bars_start_pos, dy, height, self.bar_width)
-                dy += self.bar_width + self.bars_padding
-        cr.fill()
+            self.recorder.pause()
+            if self.corked:
+                time.sleep(0.1)
+                for renderer in self.renderers:
+                    renderer.reset()
+
+    def check_recorder(self):
+        # recorder thread (or worker process) stops only on error or when replay is over
+        if self.running and not self.recorder.is_alive():
+            print('Recorder stopped, exiting.')
+            self.stop()
+            return False
+        return True
+
+    def govern(self):
+        loads = [self.recorder.load.sample()]
+        # hidden windows draw nothing, so they are not sampled
+        loads += [renderer.load.sample() for renderer in self.renderers]
+        level = self.governor.level
+        if not self.active or not self.governor.update(loads, time.perf_counter()):
+            return True
+
+        if not self.recorder.set_quality(self.governor.level):
+            self.governor.reject(level)
+            return True
+        print(self.governor.describe())
+        for renderer in self.renderers:
+            renderer.set_quality(self.governor.level)
+        return True
+
+    def check_streams(self):
+        corked = not self.recorder.listening()
+        if corked != self.corked:
+            self.corked = corked
+            self.update_activity()
+
+        return True
+
+    def on_update_with_source(self):
+        # increases CPU usage by 2% compared to running without apps
+        corked = True
+        for source in self.pulse.sink_input_list():
+            if source.proplist['application.name'] in self.listen_apps:
+                corked &= source.corked
+
+        if corked != self.corked:
+            self.corked = corked
+            self.update_activity()
+
+        return True
 
     def start(self):
         self.recorder.connect()
         self.recorder.start()
-        self.pulse = pulsectl.Pulse('source-checker')
+        if self.check_sources and not self.capture_apps:
+            self.pulse = pulsectl.Pulse('source-checker')
+        self.running = True
         print('Press Esc to exit.')
         Gtk.main()
 
     def stop(self):
+        # every window closes the whole visualizer
+        if not self.running:
+            return
+        self.running = False
+
         self.recorder.stop()
         self.recorder.join()
         self.recorder.disconnect()
-        self.pulse.close()
+        if self.pulse is not None:
+            self.pulse.close()
+        for renderer in self.renderers:
+            renderer.report()
         Gtk.main_quit()
-
-    def check_escape(self, widget, event):
-        if event.keyval == Gdk.KEY_Escape:
-            self.stop()
-            return True
-        return False
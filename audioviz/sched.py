@@ -0,0 +1,84 @@
+"""Scheduling of capture thread: CPU affinity, real-time policy, niceness
+and measurement of hop loop jitter
+
+Settings are applied to the calling thread on a best effort basis, whatever
+is not permitted is reported and skipped.
+"""
+
+
+import os
+import threading
+
+import numpy as np
+
+
+POLICIES = {'fifo': 'SCHED_FIFO', 'rr': 'SCHED_RR'}
+# ~47 seconds of hops at 44100 Hz and 512 samples per buffer
+JITTER_HOPS = 4096
+
+
+def apply_scheduling(affinity: tuple[int, ...] | None, policy: str = 'other',
+                     priority: int = 10, niceness: int = 0):
+    """Pins the calling thread to `affinity` cores and raises its priority with
+    real-time `policy` or, if it is not permitted, with `niceness`.
+    """
+    if affinity is not None:
+        try:
+            os.sched_setaffinity(0, affinity)
+        except (AttributeError, OSError) as ex:
+            print('Could not pin capture thread to cores {}: {}'.format(
+                ','.join(map(str, affinity)), ex))
+
+    if policy != 'other':
+        try:
+            os.sched_setscheduler(0, getattr(os, POLICIES[policy]), os.sched_param(priority))
+            return
+        except (AttributeError, OSError) as ex:
+            print('Could not set {} scheduling of capture thread: {}'.format(policy, ex))
+            if niceness:
+                print('Falling back to niceness {}'.format(niceness))
+
+    if niceness:
+        try:
+            # niceness of Linux threads is set by their ids
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+        except (AttributeError, OSError) as ex:
+            print('Could not set niceness {} of capture thread: {}'.format(niceness, ex))
+
+
+class JitterMeter:
+    """Deviation of intervals between hops from hop period over the last `size` hops.
+    """
+
+    def __init__(self, period: float, size: int = JITTER_HOPS):
+        self.period = period
+        self.deviations = np.zeros(size)
+        self.count = 0
+        self.max = 0.
+        self.last = None
+
+    def tick(self, now: float):
+        if self.last is not None:
+            deviation = abs(now - self.last - self.period)
+            self.deviations[self.count % self.deviations.size] = deviation
+            self.count += 1
+            self.max = max(self.max, deviation)
+        self.last = now
+
+    def reset(self):
+        """Forgets the last hop, e.g. after pause.
+        """
+        self.last = None
+
+    def stats(self) -> dict:
+        """Mean and 99th percentile of recent deviations and the largest one, ms.
+        """
+        deviations = self.deviations[:min(self.count, self.deviations.size)]
+        if not deviations.size:
+            return {'jitter_mean': 0., 'jitter_p99': 0., 'jitter_max': 0.}
+
+        return {
+            'jitter_mean': deviations.mean() * 1000,
+            'jitter_p99': np.percentile(deviations, 99) * 1000,
+            'jitter_max': self.max * 1000,
+        }
@@ -0,0 +1,129 @@
+"""Publication of band magnitudes via shared memory for other local processes
+
+Segment layout (native byte order):
+
+    offset  type          field
+    0       char[4]       magic, b'AVZB'
+    4       uint32        layout version
+    8       uint64        sequence number, odd while frame is being written
+    16      float64       frame timestamp, seconds since the epoch
+    24      uint32        bars number
+    28      uint32        beats counter, incremented on every detected beat
+    32      float32[bars] band magnitudes
+
+Sequence number works as a seqlock: a frame is consistent if sequence number
+is even and did not change while the frame was being read. Beats counter
+is written independently of frames, a change of it means a beat.
+"""
+
+
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+MAGIC = b'AVZB'
+VERSION = 1
+HEADER_SIZE = 32
+
+# segments published by this process (or its parent if forked)
+_published = set()
+
+
+def _header(buf: memoryview) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    seq = np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=8)
+    timestamp = np.ndarray((1,), dtype=np.float64, buffer=buf, offset=16)
+    bars = np.ndarray((2,), dtype=np.uint32, buffer=buf, offset=24)
+    return seq, timestamp, bars
+
+
+class BandPublisher:
+    def __init__(self, name: str, bars: int):
+        self.name = name
+        self.shm = shared_memory.SharedMemory(name, create=True,
+                                              size=HEADER_SIZE + 4 * bars)
+        _published.add(name)
+        self.shm.buf[:4] = MAGIC
+        np.ndarray((1,), dtype=np.uint32, buffer=self.shm.buf, offset=4)[0] = VERSION
+
+        self.seq, self.timestamp, header_bars = _header(self.shm.buf)
+        header_bars[0] = bars
+        self.beats = header_bars[1:]
+        self.band_mags = np.ndarray((bars,), dtype=np.float32,
+                                    buffer=self.shm.buf, offset=HEADER_SIZE)
+
+    def publish(self, band_mags: np.ndarray, timestamp: float | None = None):
+        self.seq += 1
+        self.band_mags[:] = band_mags
+        self.timestamp[0] = time.time() if timestamp is None else timestamp
+        self.seq += 1
+
+    def publish_beat(self):
+        self.beats += 1
+
+    def close(self):
+        # views must be released before the segment is closed
+        del self.seq, self.timestamp, self.beats, self.band_mags
+        self.shm.close()
+        self.shm.unlink()
+        _published.discard(self.name)
+
+
+class BandReader:
+    """Attaches to segment created by `BandPublisher`.
+
+    `band_mags` is a zero-copy view into the segment, use `stable` to check that
+    it was not overwritten while being used or `read` to get a consistent copy.
+    """
+
+    def __init__(self, name: str):
+        self.shm = shared_memory.SharedMemory(name)
+        # segment is owned by the publisher, do not let tracker unlink it on exit
+        if name not in _published:
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+
+        if bytes(self.shm.buf[:4]) != MAGIC:
+            raise ValueError('Shared memory segment {} is not published by audioviz.'.format(name))
+        version = np.ndarray((1,), dtype=np.uint32, buffer=self.shm.buf, offset=4)[0]
+        if version != VERSION:
+            raise ValueError('Unsupported layout version: {}'.format(version))
+
+        self._seq, self._timestamp, header_bars = _header(self.shm.buf)
+        self.bars = int(header_bars[0])
+        self._beats = header_bars[1:]
+        self.band_mags = np.ndarray((self.bars,), dtype=np.float32,
+                                    buffer=self.shm.buf, offset=HEADER_SIZE)
+
+    @property
+    def seq(self) -> int:
+        return int(self._seq[0])
+
+    @property
+    def beats(self) -> int:
+        return int(self._beats[0])
+
+    def stable(self, seq: int) -> bool:
+        return not seq % 2 and self.seq == seq
+
+    def read(self, out: np.ndarray | None = None,
+             retries: int = 100) -> tuple[int, float, np.ndarray]:
+        """Copies the latest consistent frame, returns its sequence, timestamp and data.
+        """
+        if out is None:
+            out = np.empty(self.bars, dtype=np.float32)
+
+        for _ in range(retries):
+            seq = self.seq
+            if seq % 2:
+                continue
+            out[:] = self.band_mags
+            timestamp = float(self._timestamp[0])
+            if self.seq == seq:
+                return seq, timestamp, out
+
+        raise TimeoutError('Could not read consistent frame.')
+
+    def close(self):
+        del self._seq, self._timestamp, self._beats, self.band_mags
+        self.shm.close()
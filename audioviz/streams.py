@@ -0,0 +1,182 @@
+"""Capture of listened applications only, one stream per application
+
+Simple API cannot record a single sink input, so every sink input of listened
+applications is recorded by its own `parec --monitor-stream` process and
+the streams are mixed into the analysis buffer. Streams follow applications:
+they are opened when an application appears and closed when it goes away,
+so audio of other applications is neither captured nor analysed.
+"""
+
+
+import os
+import select
+import subprocess
+import time
+
+import numpy as np
+
+
+# how often sink inputs of listened applications are looked up
+TRACK_PERIOD = 0.5
+# a stream does not queue more buffers, older samples are dropped
+MAX_QUEUED = 8
+SAMPLE_SIZE = 4  # float32
+
+
+def parec_command(index: int, frequency: int, channels: int, latency_msec: int) -> list[str]:
+    return [
+        'parec', '--monitor-stream={}'.format(index), '--raw', '--format=float32le',
+        '--rate={}'.format(frequency), '--channels={}'.format(channels),
+        '--latency-msec={}'.format(latency_msec), '--client-name=audioviz',
+    ]
+
+
+class AppStream:
+    """Samples of one sink input recorded by `parec` process.
+    """
+
+    def __init__(self, index: int, app: str, command: list[str]):
+        self.index = index
+        self.app = app
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL)
+        self.fd = self.process.stdout.fileno()
+        os.set_blocking(self.fd, False)
+        self.queue = bytearray()
+
+    def fill(self, limit: int) -> bool:
+        """Reads whatever was recorded, keeps at most `limit` bytes.
+        Returns whether the stream is still alive.
+        """
+        while True:
+            try:
+                chunk = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not chunk:
+                return False
+            self.queue += chunk
+
+        excess = len(self.queue) - limit
+        if excess > 0:
+            del self.queue[:excess + (-excess) % SAMPLE_SIZE]
+        return True
+
+    def mix_into(self, out: np.ndarray):
+        size = out.size * SAMPLE_SIZE
+        out += np.frombuffer(self.queue, dtype=np.float32, count=out.size)
+        del self.queue[:size]
+
+    def close(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+
+
+class AppStreamsSource:
+    """Mixes streams of listened applications, a drop-in replacement of `PulseSource`.
+
+    A buffer is returned as soon as every stream has recorded it, streams which
+    are more than a hop behind are mixed into the next one. If no stream delivers
+    audio, silence is returned, so recorder never blocks and bars fall down.
+    While no listened application plays, silence is returned every hop.
+    """
+
+    def __init__(self, config: dict):
+        self.apps = config['apps']
+        self.frequency = config['frequency']
+        self.channels = config['channels']
+        self.hop_period = config['buffer_size'] / self.frequency
+        self.latency_msec = max(int(self.hop_period * 1000), 1)
+        self.queue_limit = MAX_QUEUED * config['buffer_size'] * SAMPLE_SIZE
+
+        self.pulse = None
+        self.streams = {}
+        self.tracked = 0.
+
+    def open(self):
+        import pulsectl
+
+        self.pulse = pulsectl.Pulse('audioviz-apps')
+        self.track()
+        print('Connection established')
+
+    def track(self):
+        """Opens streams of new sink inputs of listened applications, closes gone ones.
+        """
+        inputs = {}
+        for sink_input in self.pulse.sink_input_list():
+            app = sink_input.proplist.get('application.name')
+            if app in self.apps:
+                inputs[sink_input.index] = app
+
+        for index in set(self.streams) - set(inputs):
+            self.close_stream(index)
+        for index in set(inputs) - set(self.streams):
+            self.streams[index] = AppStream(index, inputs[index], parec_command(
+                index, self.frequency, self.channels, self.latency_msec))
+            print('Capturing {} (sink input {})'.format(inputs[index], index))
+        self.tracked = time.perf_counter()
+
+    def close_stream(self, index: int):
+        stream = self.streams.pop(index)
+        stream.close()
+        print('Stopped capturing {} (sink input {})'.format(stream.app, index))
+
+    def fill(self):
+        for index, stream in list(self.streams.items()):
+            if not stream.fill(self.queue_limit):
+                # sink input is gone before it was tracked
+                self.close_stream(index)
+
+    def read(self, buffer):
+        out = np.frombuffer(buffer, dtype=np.float32)
+        size = out.size * SAMPLE_SIZE
+        started = time.perf_counter()
+        first_ready = None
+        while True:
+            now = time.perf_counter()
+            if now - self.tracked > TRACK_PERIOD:
+                self.track()
+            self.fill()
+
+            ready = [stream for stream in self.streams.values() if len(stream.queue) >= size]
+            waiting = [stream for stream in self.streams.values() if stream not in ready]
+            if ready and first_ready is None:
+                first_ready = now
+            # streams are not in phase, ones that are behind get a hop to catch up
+            if ready and (not waiting or now - first_ready > self.hop_period):
+                break
+            timeout = 4 * self.hop_period if self.streams else self.hop_period
+            if not ready and now - started > timeout:
+                break
+            if waiting:
+                select.select([stream.fd for stream in waiting], [], [], self.hop_period)
+            else:
+                time.sleep(self.hop_period)
+
+        out[:] = 0
+        for stream in ready:
+            stream.mix_into(out)
+
+    def latency(self) -> float:
+        """Seconds of recorded audio waiting to be mixed.
+        """
+        queued = max((len(stream.queue) for stream in self.streams.values()), default=0)
+        return queued / SAMPLE_SIZE / self.channels / self.frequency
+
+    def flush(self):
+        self.fill()
+        for stream in self.streams.values():
+            stream.queue.clear()
+
+    def close(self):
+        for index in list(self.streams):
+            self.close_stream(index)
+        self.pulse.close()
+        self.pulse = None
+        print('Connection closed')
@@ -0,0 +1,300 @@
+"""Process-isolated audio analysis
+
+Capture and signal processing run in a worker process which writes band frames
+into a shared memory ring, so they never compete with rendering for the GIL.
+"""
+
+
+import multiprocessing as mp
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from .filter import calc_band_bounds
+from .governor import LoadMeter
+
+
+class FrameRing:
+    """Ring of band frames in shared memory.
+
+    Layout: uint64 bars, uint64 slots, uint64 frames counter, uint64 beats counter,
+    float64 tempo, uint64 listening flag, uint64[slots] slot sequence numbers,
+    float64[slots] timestamps, float64[slots, bars] band magnitudes.
+    Sequence number of a slot is odd while the slot is written, readers copy
+    the latest slot and retry a limited number of times if the writer has lapped
+    the ring meanwhile (or died in the middle of a write).
+    """
+
+    def __init__(self, name: str | None = None, bars: int = 0, slots: int = 8):
+        if name is None:
+            size = 48 + 16 * slots + 8 * slots * bars
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+            np.ndarray((2,), dtype=np.uint64, buffer=self.shm.buf)[:] = bars, slots
+        else:
+            self.shm = shared_memory.SharedMemory(name)
+            self.owner = False
+            bars, slots = np.ndarray((2,), dtype=np.uint64, buffer=self.shm.buf)
+
+        self.name = self.shm.name
+        self.bars = int(bars)
+        self.slots = int(slots)
+
+        buf = self.shm.buf
+        offset = 16
+        self._count = np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=offset)
+        offset += 8
+        self._beats = np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=offset)
+        offset += 8
+        self._tempo = np.ndarray((1,), dtype=np.float64, buffer=buf, offset=offset)
+        offset += 8
+        self._listening = np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=offset)
+        if self.owner:
+            self._listening[0] = 1
+        offset += 8
+        self.slot_seqs = np.ndarray((self.slots,), dtype=np.uint64, buffer=buf, offset=offset)
+        offset += 8 * self.slots
+        self.timestamps = np.ndarray((self.slots,), dtype=np.float64, buffer=buf, offset=offset)
+        offset += 8 * self.slots
+        self.band_mags = np.ndarray((self.slots, self.bars), dtype=np.float64,
+                                    buffer=buf, offset=offset)
+        # a torn copy never reaches readers' buffers
+        self._frame = np.zeros(self.bars)
+
+    @property
+    def count(self) -> int:
+        return int(self._count[0])
+
+    @property
+    def beats(self) -> int:
+        return int(self._beats[0])
+
+    @property
+    def tempo(self) -> float:
+        return float(self._tempo[0])
+
+    @property
+    def listening(self) -> bool:
+        return bool(self._listening[0])
+
+    @listening.setter
+    def listening(self, listening: bool):
+        self._listening[0] = listening
+
+    def write_beat(self, tempo: float):
+        self._tempo[0] = tempo
+        self._beats += 1
+
+    def write(self, band_mags: np.ndarray):
+        slot = self.count % self.slots
+        self.slot_seqs[slot] += 1
+        self.band_mags[slot] = band_mags
+        self.timestamps[slot] = time.time()
+        self.slot_seqs[slot] += 1
+        self._count += 1
+
+    def read_latest(self, out: np.ndarray, count: int = 0, retries: int = 100) -> int:
+        """Copies the latest frame into `out`, returns frames counter.
+
+        If no consistent frame could be read, `out` is kept and `count` is returned.
+        """
+        for _ in range(retries):
+            latest = self.count
+            slot = (latest - 1) % self.slots
+            seq = int(self.slot_seqs[slot])
+            if seq % 2:
+                continue
+            self._frame[:] = self.band_mags[slot]
+            if int(self.slot_seqs[slot]) == seq:
+                out[:] = self._frame
+                return latest
+
+        return count
+
+    def close(self):
+        del self._count, self._beats, self._tempo, self.slot_seqs, self.timestamps, self.band_mags
+        del self._listening, self._frame
+        try:
+            self.shm.close()
+        except BufferError:
+            # subscribers still hold views, memory is released once they are gone
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingSubscriber:
+    """Counterpart of `Subscriber` reading from `FrameRing`.
+    """
+
+    def __init__(self, ring: FrameRing):
+        self.ring = ring
+        self.seq = 0
+        self.band_mags = np.zeros(ring.bars)
+        self.beats = 0
+        self.beat = False
+
+    def poll(self) -> bool:
+        # a worker which died in the middle of a write leaves the frame stale,
+        # recorder reports it
+        seq = self.ring.read_latest(self.band_mags, self.seq)
+        fresh = seq != self.seq
+        self.seq = seq
+
+        beats = self.ring.beats
+        self.beat = beats != self.beats
+        self.beats = beats
+        return fresh
+
+
+def _analyse(config: dict, ring_name: str, stop_event, unblock, ready):
+    from .record import Recorder
+
+    ring = FrameRing(ring_name)
+    recorder = Recorder(config)
+    recorder.add_callback(lambda: ring.write(recorder.band_mags))
+    recorder.add_beat_callback(lambda: ring.write_beat(recorder.tempo))
+    recorder.connect()
+    recorder.start()
+    ready.set()
+
+    paused = False
+    try:
+        while not stop_event.wait(0.05):
+            if not recorder.is_alive():
+                sys.exit(1)
+            ring.listening = recorder.listening()
+            if unblock.is_set() == paused:
+                paused = not paused
+                if paused:
+                    recorder.pause()
+                else:
+                    recorder.resume()
+    finally:
+        recorder.stop()
+        recorder.join()
+        recorder.disconnect()
+        ring.close()
+
+
+class ProcessRecorder(threading.Thread):
+    """Drop-in replacement for `Recorder` running analysis in a worker process.
+
+    The thread itself only watches the worker, executes callbacks
+    for new frames and detects worker crashes.
+    """
+
+    def __init__(self, config: dict, slots: int = 8):
+        super().__init__(daemon=True)
+        self.config = config
+        _, _, self.bars = calc_band_bounds(
+            config['bands_distr'], config['frequency'], config['frame_size'],
+            config['lower_freq'], config['upper_freq']
+        )
+        self.hop_period = config['buffer_size'] / config['frequency']
+
+        self.ring = FrameRing(bars=self.bars, slots=slots)
+        self.process = None
+        self.exitcode = None
+
+        # spawn to not inherit GTK and PulseAudio state of parent
+        self._context = mp.get_context('spawn')
+        self._stop_event = self._context.Event()
+        self._unblock = self._context.Event()
+        self._unblock.set()
+        self._ready = self._context.Event()
+
+        self._callbacks = []
+        self._beat_callbacks = []
+
+        # analysis runs in its own process and does not compete with drawing,
+        # so quality governor watches only windows
+        self.load = LoadMeter()
+
+    @property
+    def beats(self) -> int:
+        return self.ring.beats
+
+    @property
+    def tempo(self) -> float:
+        return self.ring.tempo
+
+    def num_bands(self):
+        return self.bars
+
+    def listening(self) -> bool:
+        return self.ring.listening
+
+    def connect(self):
+        self.process = self._context.Process(
+            target=_analyse, name='audioviz-analysis', daemon=True,
+            args=(self.config, self.ring.name, self._stop_event, self._unblock, self._ready)
+        )
+        self.process.start()
+        while not self._ready.wait(0.1):
+            if not self.process.is_alive():
+                raise RuntimeError('Analysis worker failed to start, exit code: {}'.format(
+                    self.process.exitcode))
+        print('Analysis worker started')
+
+    def run(self):
+        seq = 0
+        beats = 0
+        while not self._stop_event.is_set():
+            timeout = self.hop_period / 2 if self._callbacks or self._beat_callbacks else 0.5
+            if wait([self.process.sentinel], timeout):
+                if self._stop_event.is_set():
+                    break
+                self.exitcode = self.process.exitcode
+                print('Analysis worker died, exit code: {}'.format(self.exitcode))
+                return
+
+            count = self.ring.count
+            if count != seq:
+                seq = count
+                for callback in self._callbacks:
+                    callback()
+
+            if self.ring.beats != beats:
+                beats = self.ring.beats
+                for callback in self._beat_callbacks:
+                    callback()
+
+    def set_quality(self, level: int) -> bool:
+        return True
+
+    def resume(self):
+        self._unblock.set()
+
+    def pause(self):
+        self._unblock.clear()
+
+    def stop(self):
+        self._unblock.set()
+        self._stop_event.set()
+
+    def add_callback(self, callback):
+        self._callbacks.append(callback)
+
+    def add_beat_callback(self, callback):
+        self._beat_callbacks.append(callback)
+
+    def subscribe(self) -> RingSubscriber:
+        return RingSubscriber(self.ring)
+
+    def disconnect(self):
+        if self.process is None:
+            return
+
+        self._stop_event.set()
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.process = None
+        self.ring.close()
+        print('Analysis worker stopped')
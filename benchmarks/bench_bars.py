@@ -0,0 +1,84 @@
+"""Measures how analysis (and software rendering, if cairo is installed) scales
+with the number of bars and threads processing them.
+
+Bands are split between threads only from `PARALLEL_BARS` bars, fewer bars are
+always processed by one thread.
+
+Usage: python benchmarks/bench_bars.py [seconds]
+"""
+
+
+import sys
+import time
+from importlib import resources
+
+import numpy as np
+from timing import time_hop
+
+from audioviz.analysis import Analyzer
+from audioviz.autotune import split_buffers, synthesize
+from audioviz.config import parse_config
+from audioviz.filter import PARALLEL_BARS
+from audioviz.jit import available_threads
+
+
+BARS = [64, 128, 256, 512, 1024]
+REPEATS = 5
+FRAMES = 200
+
+
+def thread_counts() -> list[int]:
+    counts = [1, 2, 4, available_threads()]
+    return sorted({count for count in counts if count <= available_threads()})
+
+
+def bench_analysis(config: dict, buffers: np.ndarray) -> float:
+    """Mean time of one analysed hop in microseconds.
+    """
+    analyzer = Analyzer(config)
+    analyzer.warm_up(buffers[0])
+    return time_hop(analyzer, buffers, REPEATS) * 1e6
+
+
+def bench_render(config: dict, bars: int) -> float:
+    """Mean time of one rendered frame in microseconds, nan without cairo.
+    """
+    try:
+        from audioviz.offscreen import OffscreenRenderer
+    except ImportError:
+        return float('nan')
+
+    renderer = OffscreenRenderer(config, bars)
+    mags = np.random.default_rng(0).random((FRAMES, bars))
+    renderer.render(mags[0])
+
+    start = time.perf_counter()
+    for band_mags in mags:
+        renderer.render(band_mags)
+    return (time.perf_counter() - start) / FRAMES * 1e6
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.
+    config = parse_config(resources.files('audioviz.cli').joinpath('data/config.cfg'))
+    config.update(analysis_rate=None, rasterizer='software', size=(3840, 1080), padding=1)
+
+    audio = synthesize(config['frequency'], int(seconds * config['frequency']))
+    buffers = split_buffers(audio, config['buffer_size'])
+
+    threads = thread_counts()
+    print('Threads available: {}, bands are split from {} bars'.format(
+        available_threads(), PARALLEL_BARS))
+    print('{:>6} {:>8} {:>14} {:>14}'.format('bars', 'threads', 'analysis, us', 'render, us'))
+    for bars in BARS:
+        config['bands_distr'] = ('logspace', bars)
+        for count in threads:
+            if count > 1 and bars < PARALLEL_BARS:
+                continue
+            config['threads'] = count
+            print('{:>6} {:>8} {:>14.1f} {:>14.1f}'.format(
+                bars, count, bench_analysis(config, buffers), bench_render(config, bars)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Compares numba and pure numpy kernels: memory footprint, start up time
+and per-frame cost. Every engine runs in its own process, since engine is
+chosen once per process. Parity of outputs is checked by tests/test_engines.py.
+
+Usage: python benchmarks/bench_engines.py [seconds]
+"""
+
+
+import subprocess
+import sys
+import time
+
+from timing import read_rss, time_hop
+
+
+REPEATS = 5
+
+
+def child(engine: str, seconds: float):
+    """Analyses synthetic audio with kernels of `engine` and prints measurements.
+    """
+    start = time.perf_counter()
+    from importlib import resources
+
+    from audioviz.jit import select_jit
+    select_jit(engine)
+
+    import numpy as np
+
+    from audioviz.analysis import Analyzer
+    from audioviz.autotune import split_buffers, synthesize
+    from audioviz.config import parse_config
+    from audioviz.effect import monstercat
+    imported = time.perf_counter() - start
+
+    config = parse_config(resources.files('audioviz.cli').joinpath('data/config.cfg'))
+    config.update(analysis_rate=None, beats=True)
+    audio = synthesize(config['frequency'], int(seconds * config['frequency']))
+    buffers = split_buffers(audio, config['buffer_size'])
+
+    start = time.perf_counter()
+    analyzer = Analyzer(config)
+    analyzer.warm_up(buffers[0])
+    monstercat(np.ones(analyzer.bars), config['monstercat'])
+    warmed_up = time.perf_counter() - start
+
+    hop = time_hop(analyzer, buffers, REPEATS,
+                   lambda band_mags: monstercat(band_mags * 1000, config['monstercat']))
+    print(imported, warmed_up, read_rss(), hop)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], float(sys.argv[3]))
+        return
+
+    from audioviz.jit import available_jit_engines
+
+    seconds = sys.argv[1] if len(sys.argv) > 1 else '10'
+    print('{:>8} {:>11} {:>14} {:>9} {:>9}'.format(
+        'engine', 'import, s', 'warm-up, s', 'rss, MB', 'hop, us'))
+    for engine in available_jit_engines():
+        result = subprocess.run([sys.executable, __file__, '--child', engine, seconds],
+                                capture_output=True, text=True)
+        if result.returncode:
+            print('{:>8}: failed\n{}'.format(engine, result.stderr))
+            sys.exit(1)
+        imported, warmed_up, rss, hop = map(float, result.stdout.split()[-4:])
+        print('{:>8} {:>11.2f} {:>14.2f} {:>9.1f} {:>9.1f}'.format(
+            engine, imported, warmed_up, rss, hop * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Measures cold start of CLI commands and GUI imports, lists the slowest imports.
+
+Exits with non-zero status if commands that do not render import heavy modules.
+
+Usage: python benchmarks/bench_import.py [repeats]
+"""
+
+
+import os
+import subprocess
+import sys
+import time
+
+
+# modules that are needed only for analysis and rendering
+HEAVY = ['numpy', 'numba', 'gi', 'cairo', 'scipy', 'pyfftw', 'pulsectl']
+COMMANDS = {
+    'audioviz -d': "import sys; sys.argv = ['audioviz', '-d']; "
+                   "from audioviz.cli.run import run; run()",
+    'import cli': 'import audioviz.cli.run',
+    'import gui': 'import audioviz.render',
+}
+# commands that must stay light
+LIGHT = ['audioviz -d', 'import cli']
+TOP = 8
+
+
+def profile(code: str) -> tuple[float, list[tuple[int, str]]] | None:
+    """Returns wall time of a fresh interpreter running `code` and cumulative
+    import times (us) of all modules it imported.
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, env=dict(os.environ))
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        return None
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        imports.append((int(cumulative), name.strip()))
+    return elapsed, imports
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    failed = False
+    for command, code in COMMANDS.items():
+        results = [profile(code) for _ in range(repeats)]
+        if None in results:
+            print('{:>12}: failed to run, dependencies are missing?'.format(command))
+            failed |= command in LIGHT
+            continue
+
+        # the fastest run is the least affected by disk cache and other processes
+        elapsed, imports = min(results)
+        print('{:>12}: {:.1f} ms'.format(command, elapsed * 1000))
+        for cumulative, name in sorted(imports, reverse=True)[:TOP]:
+            print('{:>14} {:>8.1f} ms  {}'.format('', cumulative / 1000, name))
+
+        heavy = sorted({name for _, name in imports if name.split('.')[0] in HEAVY})
+        if command in LIGHT and heavy:
+            print('{:>12}  imports heavy modules: {}'.format('', ', '.join(heavy[:TOP])))
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Measures how long band plans take to compute and to take from memory cache
+for different layouts, and how long analysis is rebuilt with a cached plan.
+
+Exits with non-zero status if a cached plan differs from the computed one.
+
+Usage: python benchmarks/bench_plan.py [repeats]
+"""
+
+
+import sys
+from importlib import resources
+
+import numpy as np
+from timing import best_time
+
+from audioviz.analysis import Analyzer
+from audioviz.config import parse_config
+from audioviz.plan import PLAN_ARRAYS, calc_band_plan, load_band_plan
+
+
+FREQUENCY = 44100
+FREQ_BOUNDS = (12, 12000)
+WINDOW = 'hanning'
+LAYOUTS = [
+    (('logspace', 63), 8192),
+    (('logspace', 256), 16384),
+    (('logspace', 1024), 32768),
+    (('octave', 3), 8192),
+    (('octave', 12), 16384),
+    (('octave', 48), 32768),
+]
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    config = parse_config(resources.files('audioviz.cli').joinpath('data/config.cfg'))
+    config.update(frequency=FREQUENCY, lower_freq=FREQ_BOUNDS[0], upper_freq=FREQ_BOUNDS[1],
+                  window_type=WINDOW)
+    failures = []
+
+    print('{:>16} {:>7} {:>13} {:>12} {:>13}'.format(
+        'layout', 'frame', 'compute, ms', 'cached, us', 'analyzer, ms'))
+    for distr, frame_size in LAYOUTS:
+        key = (distr, FREQUENCY, frame_size, *FREQ_BOUNDS, WINDOW)
+        computed = best_time(lambda: calc_band_plan(*key), repeats)
+        load_band_plan(*key)
+        cached = best_time(lambda: load_band_plan(*key), repeats)
+        analyzer = best_time(
+            lambda: Analyzer(dict(config, bands_distr=distr, frame_size=frame_size)), repeats)
+
+        plan = calc_band_plan(*key)
+        cached_plan = load_band_plan(*key)
+        if cached_plan['bars'] != plan['bars'] or not all(
+                np.array_equal(cached_plan[name], plan[name]) for name in PLAN_ARRAYS):
+            failures.append('{} {}'.format(','.join(map(str, distr)), frame_size))
+
+        print('{:>16} {:>7} {:>13.3f} {:>12.2f} {:>13.3f}'.format(
+            ','.join(map(str, distr)), frame_size, computed * 1e3, cached * 1e6,
+            analyzer * 1e3))
+
+    for failure in failures:
+        print('FAIL: cached plan differs from computed one for {}'.format(failure))
+    if failures:
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Compares throughput of single and double precision analysis,
+deviation of bars is checked by `tests/test_precision.py`.
+
+Usage: python benchmarks/bench_precision.py [seconds]
+"""
+
+
+import sys
+from importlib import resources
+
+import numpy as np
+from timing import time_hop
+
+from audioviz.analysis import Analyzer
+from audioviz.autotune import split_buffers, synthesize
+from audioviz.config import parse_config
+from audioviz.filter import available_fft_engines
+
+
+REPEATS = 5
+
+
+def run(config: dict, buffers: np.ndarray) -> float:
+    analyzer = Analyzer(config)
+    analyzer.warm_up(buffers[0])
+    return 1 / time_hop(analyzer, buffers, REPEATS)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10.
+    config = parse_config(resources.files('audioviz.cli').joinpath('data/config.cfg'))
+    config['analysis_rate'] = None
+
+    audio = synthesize(config['frequency'], int(seconds * config['frequency']))
+    buffers = split_buffers(audio, config['buffer_size'])
+
+    print('{:>8} {:>7} {:>16} {:>16} {:>8}'.format(
+        'engine', 'scale', 'double, hops/s', 'single, hops/s', 'speedup'))
+    for engine in available_fft_engines():
+        for scale in ['linear', 'db']:
+            config.update(fft_engine=engine, scale=scale)
+            double_rate = run(dict(config, precision='double'), buffers)
+            single_rate = run(dict(config, precision='single'), buffers)
+            print('{:>8} {:>7} {:>16.0f} {:>16.0f} {:>8.2f}'.format(
+                engine, scale, double_rate, single_rate, single_rate / double_rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Measures offscreen rendering speed of bars for cairo and software rasterizers.
+
+Usage: python benchmarks/bench_render.py [frames]
+"""
+
+
+import sys
+import time
+from importlib import resources
+
+import numpy as np
+
+from audioviz.config import parse_config
+from audioviz.offscreen import OffscreenRenderer
+
+
+BARS = [32, 63, 128, 256]
+SIZES = [(800, 200), (1920, 1080), (3840, 2160)]
+ROTATIONS = [0, 90, 180, 270]
+RASTERIZERS = ['cairo', 'software']
+
+
+def bench(config: dict, bars: int, frames: int) -> float:
+    renderer = OffscreenRenderer(config, bars)
+    rng = np.random.default_rng(0)
+    mags = rng.random((frames, bars))
+
+    # warm-up jit
+    renderer.render(mags[0])
+
+    start = time.perf_counter()
+    for band_mags in mags:
+        renderer.render(band_mags)
+        renderer.rgba()
+    return frames / (time.perf_counter() - start)
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    config = parse_config(resources.files('audioviz.cli').joinpath('data/config.cfg'))
+
+    print('{:>6} {:>11} {:>8} {:>10} {:>10}'.format(
+        'bars', 'size', 'rotation', *('{} fps'.format(name) for name in RASTERIZERS)))
+    for size in SIZES:
+        for bars in BARS:
+            for rotation in ROTATIONS:
+                results = []
+                for rasterizer in RASTERIZERS:
+                    config.update(size=size, rotation=rotation, rasterizer=rasterizer)
+                    results.append(bench(config, bars, frames))
+                print('{:>6} {:>11} {:>8} {:>10.1f} {:>10.1f}'.format(
+                    bars, '{}x{}'.format(*size), rotation, *results))
+
+
+if __name__ == '__main__':
+    main()
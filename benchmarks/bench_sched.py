@@ -0,0 +1,92 @@
+"""Measures jitter of the hop loop with default scheduling and with the given one,
+optionally under synthetic CPU load. Audio is synthetic and fed in real time.
+
+Usage: python benchmarks/bench_sched.py [--seconds 20] [--load 8]
+           [--affinity 2] [--scheduling fifo] [--priority 10] [--niceness -5]
+"""
+
+
+import argparse
+import multiprocessing as mp
+import time
+from importlib import resources
+
+from soak import SyntheticSource
+
+from audioviz.config import (
+    parse_config, validate_affinity, validate_niceness, validate_priority, validate_scheduling
+)
+from audioviz.record import Recorder
+
+
+def parse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=20.,
+                        help='Duration of every run. Default is 20.')
+    parser.add_argument('--load', type=int, default=0,
+                        help='Number of busy processes competing for CPU. Default is 0.')
+    parser.add_argument('--affinity', type=str, default='None',
+                        help='Cores to pin capture thread to, e.g. 2,3 or 2-3.')
+    parser.add_argument('--scheduling', type=str, default='other',
+                        help='Scheduling policy: other, fifo or rr. Default is other.')
+    parser.add_argument('--priority', type=int, default=10,
+                        help='Real-time priority for fifo and rr. Default is 10.')
+    parser.add_argument('--niceness', type=int, default=0,
+                        help='Niceness of capture thread. Default is 0.')
+    return parser.parse_args()
+
+
+def burn(stop_event):
+    while not stop_event.is_set():
+        sum(range(10000))
+
+
+def measure(config: dict, seconds: float) -> dict:
+    source = SyntheticSource(config, speed=1.)
+    recorder = Recorder(config, source)
+    recorder.connect()
+    recorder.start()
+    time.sleep(seconds)
+    recorder.stop()
+    recorder.join()
+    stats = recorder.stats()
+    recorder.disconnect()
+    return stats
+
+
+def main():
+    args = parse()
+    config = parse_config(resources.files('audioviz.cli').joinpath('data/config.cfg'))
+    config.update(shared_memory=None, history=None)
+
+    stop_event = mp.Event()
+    load = [mp.Process(target=burn, args=(stop_event,), daemon=True) for _ in range(args.load)]
+    for process in load:
+        process.start()
+
+    settings = {
+        'default': dict(affinity=None, scheduling='other', niceness=0),
+        'configured': dict(affinity=validate_affinity(args.affinity),
+                           scheduling=validate_scheduling(args.scheduling),
+                           priority=validate_priority(args.priority),
+                           niceness=validate_niceness(args.niceness)),
+    }
+    results = {}
+    try:
+        for name, setting in settings.items():
+            results[name] = measure(dict(config, **setting), args.seconds)
+    finally:
+        stop_event.set()
+        for process in load:
+            process.join()
+
+    print('{:>12} {:>11} {:>10} {:>10} {:>9}'.format(
+        'scheduling', 'mean, ms', 'p99, ms', 'max, ms', 'overruns'))
+    for name, stats in results.items():
+        print('{:>12} {:>11.3f} {:>10.3f} {:>10.3f} {:>9}'.format(
+            name, stats['jitter_mean'], stats['jitter_p99'], stats['jitter_max'],
+            stats['overruns']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Measures overhead of publishing band magnitudes to shared memory.
+
+Usage: python benchmarks/bench_shm.py [frames]
+"""
+
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from audioviz.shm import BandPublisher, BandReader
+
+
+BARS = [32, 63, 128, 256, 1024]
+
+
+def bench(bars: int, frames: int) -> tuple[float, float]:
+    name = 'audioviz-bench-{}'.format(os.getpid())
+    publisher = BandPublisher(name, bars)
+    reader = BandReader(name)
+    band_mags = np.random.default_rng(0).random(bars)
+    out = np.empty(bars, dtype=np.float32)
+
+    try:
+        start = time.perf_counter()
+        for _ in range(frames):
+            publisher.publish(band_mags)
+        publish_time = (time.perf_counter() - start) / frames
+
+        start = time.perf_counter()
+        for _ in range(frames):
+            reader.read(out)
+        read_time = (time.perf_counter() - start) / frames
+    finally:
+        reader.close()
+        publisher.close()
+
+    return publish_time, read_time
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    print('{:>6} {:>14} {:>14}'.format('bars', 'publish, us', 'read, us'))
+    for bars in BARS:
+        publish_time, read_time = bench(bars, frames)
+        print('{:>6} {:>14.2f} {:>14.2f}'.format(bars, publish_time * 1e6, read_time * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Checks capture of application streams against a running PulseAudio daemon.
+
+Two tones are played by `paplay` into a null sink under different application
+names, only one of them is listened to. The check fails if the other tone leaks
+into captured audio, or if the stream is not closed when its application stops.
+
+Requires `pactl`, `paplay` and `parec` utilities.
+
+Usage: python benchmarks/check_app_streams.py
+"""
+
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from audioviz.streams import AppStreamsSource
+
+
+FREQUENCY = 44100
+BUFFER_SIZE = 512
+SINK = 'audioviz_check'
+# listened and ignored applications with their tones, Hz
+LISTENED = ('audioviz-check-listened', 440.)
+IGNORED = ('audioviz-check-ignored', 1320.)
+# ignored tone must be that much weaker than the listened one
+LEAK_RATIO = 1e-2
+
+
+def write_tone(path: str, frequency: float, seconds: float = 30.):
+    samples = np.sin(2 * np.pi * frequency * np.arange(int(seconds * FREQUENCY)) / FREQUENCY)
+    with wave.open(path, 'wb') as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(FREQUENCY)
+        file.writeframes((samples * 16000).astype('<i2').tobytes())
+
+
+def play(path: str, app: str) -> subprocess.Popen:
+    return subprocess.Popen(['paplay', '--device={}'.format(SINK),
+                             '--property=application.name={}'.format(app), path])
+
+
+def capture(source: AppStreamsSource, seconds: float) -> np.ndarray:
+    buffer = np.zeros(BUFFER_SIZE, dtype=np.float32)
+    frames = []
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        source.read(buffer)
+        frames.append(buffer.copy())
+    return np.concatenate(frames)
+
+
+def magnitude_at(samples: np.ndarray, frequency: float) -> float:
+    mags = np.abs(np.fft.rfft(samples * np.hanning(samples.size)))
+    freqs = np.fft.rfftfreq(samples.size, 1 / FREQUENCY)
+    return mags[np.abs(freqs - frequency).argmin()]
+
+
+def main():
+    module = subprocess.run(['pactl', 'load-module', 'module-null-sink',
+                             'sink_name={}'.format(SINK)],
+                            capture_output=True, text=True, check=True).stdout.strip()
+    players = []
+    failures = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for app, frequency in (LISTENED, IGNORED):
+                path = os.path.join(directory, '{}.wav'.format(app))
+                write_tone(path, frequency)
+                players.append(play(path, app))
+            time.sleep(0.5)
+
+            source = AppStreamsSource({'apps': [LISTENED[0]], 'frequency': FREQUENCY,
+                                       'channels': 1, 'buffer_size': BUFFER_SIZE})
+            source.open()
+            try:
+                samples = capture(source, 2.)[FREQUENCY // 2:]
+                listened = magnitude_at(samples, LISTENED[1])
+                ignored = magnitude_at(samples, IGNORED[1])
+                print('Listened tone: {:.3g}, ignored tone: {:.3g}'.format(listened, ignored))
+                if not listened or ignored > listened * LEAK_RATIO:
+                    failures.append('ignored application is captured')
+
+                players[0].terminate()
+                players[0].wait()
+                capture(source, 1.)
+                if source.streams:
+                    failures.append('stream of stopped application is not closed')
+            finally:
+                source.close()
+    finally:
+        for player in players:
+            player.terminate()
+            player.wait()
+        subprocess.run(['pactl', 'unload-module', module])
+
+    for failure in failures:
+        print('FAIL: {}'.format(failure))
+    if failures:
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
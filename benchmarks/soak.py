@@ -0,0 +1,254 @@
+"""Soak test: runs analysis (and optionally offscreen rendering) for simulated hours
+at accelerated speed and watches memory, hop processing time and output drift.
+
+Exits with non-zero status if any threshold is exceeded.
+
+Usage: python benchmarks/soak.py [--hours 8] [--replay history.avz] [--render]
+"""
+
+
+import argparse
+import ctypes
+import math
+import sys
+import time
+from importlib import resources
+
+import numpy as np
+from timing import read_rss
+
+from audioviz.autotune import synthesize
+from audioviz.config import parse_config
+from audioviz.record import Recorder, ReplayRecorder
+
+
+# synthetic audio is looped with a different level every time to exercise autogain
+CLIP_SECONDS = 30
+LEVELS = [1.0, 0.3, 0.01, 0.0, 0.5]
+
+
+class SyntheticSource:
+    """Feeds recorder with synthetic audio as fast as possible (or `speed` times
+    faster than real time) and measures how long recorder spends on every hop.
+    """
+
+    def __init__(self, config: dict, speed: float = math.inf):
+        self.frequency = config['frequency']
+        self.buffer_size = config['buffer_size']
+        self.clip = synthesize(self.frequency, CLIP_SECONDS * self.frequency)
+        self.period = self.buffer_size / self.frequency / speed
+
+        self.hops = 0
+        self.position = 0
+        self.level = LEVELS[0]
+        self.hop_times = []
+        self.returned = None
+        self.started = 0.
+
+    @property
+    def simulated(self) -> float:
+        return self.hops * self.buffer_size / self.frequency
+
+    def open(self):
+        self.started = time.perf_counter()
+
+    def read(self, buffer: ctypes.Array):
+        now = time.perf_counter()
+        if self.returned is not None:
+            # time spent by recorder between two reads
+            self.hop_times.append(now - self.returned)
+
+        end = self.position + self.buffer_size
+        if end > self.clip.size:
+            self.position, end = 0, self.buffer_size
+            self.level = LEVELS[(LEVELS.index(self.level) + 1) % len(LEVELS)]
+        np.multiply(self.clip[self.position:end], self.level,
+                    out=np.frombuffer(buffer, dtype=np.float32))
+        self.position = end
+        self.hops += 1
+
+        delay = self.started + self.hops * self.period - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self.returned = time.perf_counter()
+
+    def latency(self) -> float:
+        # only paced feeding can fall behind
+        if not self.period:
+            return 0.
+        behind = time.perf_counter() - self.started - self.hops * self.period
+        return max(behind, 0.) / self.period * self.buffer_size / self.frequency
+
+    def flush(self):
+        if self.period:
+            self.hops = max(int((time.perf_counter() - self.started) / self.period), self.hops)
+
+    def close(self):
+        pass
+
+
+def parse() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hours', type=float, default=8.,
+                        help='Simulated duration. Default is 8.')
+    parser.add_argument('--speed', type=float, default=math.inf,
+                        help='Speed relative to real time. Default is as fast as possible.')
+    parser.add_argument('--interval', type=float, default=10.,
+                        help='Simulated minutes between samples. Default is 10.')
+    parser.add_argument('--replay', type=str, required=False,
+                        help='Loop recorded history instead of analysing synthetic audio.')
+    parser.add_argument('--render', action='store_true',
+                        help='Render every new frame offscreen.')
+    parser.add_argument('--max-rss-growth', type=float, default=20.,
+                        help='Allowed memory growth since the first sample, MB. Default is 20.')
+    parser.add_argument('--max-hop-growth', type=float, default=1.5,
+                        help='Allowed ratio of mean hop time to the first sample. Default is 1.5.')
+    parser.add_argument('--max-adjustment', type=float, default=1e4,
+                        help='Allowed autogain adjustment (and its reciprocal). Default is 1e4.')
+    return parser.parse_args()
+
+
+class Monitor:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.first_rss = None
+        self.first_hop = None
+        self.failures = []
+        print('{:>8} {:>8} {:>10} {:>10} {:>8} {:>8} {:>11} {:>11} {:>9}'.format(
+            'hours', 'rss, MB', 'hop, ms', 'p99, ms', 'bars', 'max', 'adj min', 'adj max',
+            'overruns'))
+
+    def fail(self, message: str):
+        self.failures.append(message)
+        print('FAIL: {}'.format(message))
+
+    def sample(self, hours: float, band_mags: np.ndarray, hop_times: list | None = None,
+               adjustment: np.ndarray | None = None, overruns: int = 0):
+        rss = read_rss()
+        if self.first_rss is None:
+            self.first_rss = rss
+
+        hop = p99 = math.nan
+        if hop_times:
+            hop = np.mean(hop_times) * 1000
+            p99 = np.percentile(hop_times, 99) * 1000
+            hop_times.clear()
+            if self.first_hop is None:
+                self.first_hop = hop
+
+        adj_min = adj_max = math.nan
+        if adjustment is not None:
+            adj_min, adj_max = adjustment.min(), adjustment.max()
+
+        print('{:>8.2f} {:>8.1f} {:>10.3f} {:>10.3f} {:>8.3f} {:>8.3f} {:>11.3g} {:>11.3g} '
+              '{:>9}'.format(hours, rss, hop, p99, band_mags.mean(), band_mags.max(),
+                             adj_min, adj_max, overruns))
+        sys.stdout.flush()
+
+        if not np.isfinite(band_mags).all():
+            self.fail('non-finite bars at {:.2f} h'.format(hours))
+        if rss - self.first_rss > self.args.max_rss_growth:
+            self.fail('memory grew by {:.1f} MB at {:.2f} h'.format(rss - self.first_rss, hours))
+        if self.first_hop is not None and hop > self.first_hop * self.args.max_hop_growth:
+            self.fail('hop time grew from {:.3f} to {:.3f} ms at {:.2f} h'.format(
+                self.first_hop, hop, hours))
+        if adjustment is not None and (adj_max > self.args.max_adjustment
+                                       or adj_min < 1 / self.args.max_adjustment):
+            self.fail('autogain drifted to {:.3g}..{:.3g} at {:.2f} h'.format(
+                adj_min, adj_max, hours))
+
+
+def create_renderer(config: dict, bars: int, render: bool):
+    if not render:
+        return None
+
+    from audioviz.offscreen import OffscreenRenderer
+    return OffscreenRenderer(config, bars)
+
+
+def soak_analysis(config: dict, args: argparse.Namespace, monitor: Monitor):
+    source = SyntheticSource(config, args.speed)
+    recorder = Recorder(config, source)
+    subscriber = recorder.subscribe()
+    renderer = create_renderer(config, recorder.num_bands(), args.render)
+    recorder.connect()
+    recorder.start()
+
+    interval = args.interval * 60
+    next_sample = interval
+    try:
+        while source.simulated < args.hours * 3600:
+            if not recorder.is_alive():
+                monitor.fail('recorder stopped')
+                break
+            if subscriber.poll() and renderer is not None:
+                renderer.render(subscriber.band_mags)
+            time.sleep(0.001)
+
+            if source.simulated >= next_sample:
+                next_sample += interval
+                # swap instead of clearing, recorder thread keeps appending
+                hop_times, source.hop_times = source.hop_times, []
+                monitor.sample(source.simulated / 3600, subscriber.band_mags, hop_times,
+                               recorder.analyzer.adjustment, recorder.overruns)
+    finally:
+        recorder.stop()
+        recorder.join()
+        recorder.disconnect()
+
+
+def soak_replay(config: dict, args: argparse.Namespace, monitor: Monitor):
+    renderer = None
+    simulated = 0.
+    interval = args.interval * 60
+    next_sample = interval
+    # history is looped until simulated duration is reached
+    while simulated < args.hours * 3600 and not monitor.failures:
+        recorder = ReplayRecorder(args.replay, args.speed)
+        reader = recorder.reader
+        frame_period = (reader.timestamps[-1] - reader.timestamps[0]) / max(len(reader) - 1, 1)
+        if renderer is None:
+            renderer = create_renderer(config, recorder.num_bands(), args.render)
+        subscriber = recorder.subscribe()
+        recorder.start()
+
+        finished = False
+        while not finished:
+            finished = not recorder.is_alive()
+            if subscriber.poll() and renderer is not None:
+                renderer.render(subscriber.band_mags)
+            time.sleep(0.001)
+
+            if simulated + subscriber.seq * frame_period >= next_sample:
+                next_sample += interval
+                monitor.sample((simulated + subscriber.seq * frame_period) / 3600,
+                               subscriber.band_mags)
+
+        recorder.join()
+        simulated += subscriber.seq * frame_period
+
+
+def main():
+    args = parse()
+    config = parse_config(resources.files('audioviz.cli').joinpath('data/config.cfg'))
+    config['shared_memory'] = None
+    config['history'] = None
+
+    monitor = Monitor(args)
+    start = time.perf_counter()
+    try:
+        if args.replay:
+            soak_replay(config, args, monitor)
+        else:
+            soak_analysis(config, args, monitor)
+    except KeyboardInterrupt:
+        monitor.fail('interrupted')
+
+    print('Wall time: {:.1f} s'.format(time.perf_counter() - start))
+    if monitor.failures:
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
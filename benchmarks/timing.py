@@ -0,0 +1,39 @@
+"""Measurements shared by benchmarks
+"""
+
+
+import os
+import time
+
+
+def read_rss() -> float:
+    """Resident set size of this process in MB.
+    """
+    with open('/proc/self/statm') as file:
+        pages = int(file.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def best_time(function, repeats: int) -> float:
+    """Wall time of the fastest of `repeats` calls, it is the least affected
+    by other processes.
+    """
+    elapsed = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+
+def time_hop(analyzer, buffers, repeats: int, effect=None) -> float:
+    """Wall time (s) of one analysed hop, `effect` is applied to band magnitudes
+    of every hop. Unlike `autotune.measure_load` it counts time of all threads.
+    """
+    def analyse():
+        for buffer in buffers:
+            analyzer.process(buffer)
+            if effect is not None:
+                effect(analyzer.band_mags)
+
+    return best_time(analyse, repeats) / len(buffers)
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+
+# `profile = auto` of default config must not pick up profile of the developer's machine,
+# subprocesses of tests inherit the environment
+_config_home = tempfile.TemporaryDirectory()
+os.environ['XDG_CONFIG_HOME'] = _config_home.name
@@ -0,0 +1,38 @@
+import json
+import os
+import tempfile
+import unittest
+from importlib import resources
+
+from audioviz.config import default_profile_path, parse_config
+
+
+PROFILE = {'frame_size': 4096, 'buffer_size': 256, 'fft_engine': 'numpy', 'frequency': 44100}
+
+
+class TestProfile(unittest.TestCase):
+    def setUp(self):
+        with resources.files('audioviz.cli').joinpath('data/config.cfg').open() as file:
+            self.default_config = file.read()
+        os.makedirs(os.path.dirname(default_profile_path()), exist_ok=True)
+        with open(default_profile_path(), 'w') as file:
+            json.dump(PROFILE, file)
+        self.addCleanup(os.remove, default_profile_path())
+
+    def parse(self, frequency: int) -> dict:
+        with tempfile.NamedTemporaryFile('w', suffix='.cfg') as file:
+            file.write(self.default_config.replace(
+                'frequency = 44100', 'frequency = {}'.format(frequency)))
+            file.flush()
+            return parse_config(file.name)
+
+    def test_applied_at_tuned_frequency(self):
+        config = self.parse(44100)
+        self.assertEqual((config['frame_size'], config['buffer_size']), (4096, 256))
+
+    def test_ignored_at_other_frequency(self):
+        config = self.parse(96000)
+        self.assertEqual((config['frame_size'], config['buffer_size']), (8192, 512))
+
+    def test_tests_do_not_see_local_profile(self):
+        self.assertFalse(default_profile_path().startswith(os.path.expanduser('~/.config')))
@@ -0,0 +1,142 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from audioviz.jit import available_jit_engines
+
+
+# results are the same up to rounding of double precision
+TOLERANCE = 1e-9
+SECONDS = 2
+HEIGHT = 200
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_kernels(engine: str, path: str):
+    """Runs kernels of `engine` over synthetic audio and saves their outputs to `path`.
+
+    Engine is chosen once per process, so it is called in a fresh interpreter.
+    """
+    from importlib import resources
+
+    from audioviz.jit import select_jit
+    select_jit(engine)
+
+    from audioviz.analysis import Analyzer
+    from audioviz.autotune import split_buffers, synthesize
+    from audioviz.beat import BeatDetector, detect_onset
+    from audioviz.config import parse_config
+    from audioviz.effect import monstercat
+    from audioviz.filter import (
+        gather_energy, gather_energy_parallel, gather_power, gather_power_parallel
+    )
+
+    config = parse_config(resources.files('audioviz.cli').joinpath('data/config.cfg'))
+    config.update(analysis_rate=None, precision='double')
+    audio = synthesize(config['frequency'], SECONDS * config['frequency'])
+    buffers = split_buffers(audio, config['buffer_size'])
+
+    # spectra are computed by the same rfft for both engines
+    analyzer = Analyzer(dict(config, scale='linear', beats=True))
+    spectra = np.empty((len(buffers), analyzer.fft_mags.size))
+    for i, buffer in enumerate(buffers):
+        analyzer.process(buffer)
+        spectra[i] = analyzer.fft_mags
+    power = Analyzer(dict(config, scale='db'))
+
+    outputs = {}
+    bars = analyzer.bars
+    for name, gather in [('energy', gather_energy), ('energy_parallel', gather_energy_parallel)]:
+        adjustment, prev_mags = np.ones(bars), np.zeros(bars)
+        band_mags = outputs[name] = np.empty((len(spectra), bars))
+        for i, fft_mags in enumerate(spectra):
+            gather(fft_mags, bars, analyzer.gain_bins, analyzer.gain_offsets, analyzer.gains,
+                   adjustment, band_mags[i], prev_mags, analyzer.noise_reduction, 1 + i % 2)
+    for name, gather in [('power', gather_power), ('power_parallel', gather_power_parallel)]:
+        prev_mags = np.zeros(bars)
+        band_mags = outputs[name] = np.empty((len(spectra), bars))
+        for i, fft_mags in enumerate(spectra):
+            gather(fft_mags, bars, power.gain_bins, power.gain_offsets, power.gains,
+                   *power.db_range, band_mags[i], prev_mags, power.noise_reduction, 1 + i % 2)
+
+    heights = outputs['monstercat'] = outputs['energy'] * HEIGHT
+    for row in heights:
+        monstercat(row, config['monstercat'])
+
+    beats = BeatDetector(analyzer.beats.fft_lower_bounds, analyzer.beats.fft_upper_bounds,
+                         analyzer.hop_period)
+    onsets = outputs['onset'] = np.empty((len(spectra), 2))
+    for i, fft_mags in enumerate(spectra):
+        onsets[i] = detect_onset(fft_mags, beats.fft_lower_bounds, beats.fft_upper_bounds,
+                                 beats.prev_mags, beats.history, i)
+
+    try:
+        from audioviz.draw import rasterize_bars, rasterize_bars_parallel
+    except ImportError:
+        # drawing needs cairo
+        np.savez(path, **outputs)
+        return
+
+    lut = np.arange(1, HEIGHT + 1, dtype=np.uint32)
+    for name, rasterize in [('raster', rasterize_bars),
+                            ('raster_parallel', rasterize_bars_parallel)]:
+        pixels = np.zeros((HEIGHT, bars * 4), dtype=np.uint32)
+        prev_heights = np.zeros(bars, dtype=np.int64)
+        frames = outputs[name] = np.empty((len(heights), *pixels.shape), dtype=np.uint32)
+        for i, row in enumerate(heights):
+            rasterize(pixels, row, prev_heights, 4, 3, lut)
+            frames[i] = pixels
+    np.savez(path, **outputs)
+
+
+class TestEngineParity(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.outputs = {}
+        if len(available_jit_engines()) < 2:
+            return
+
+        with tempfile.TemporaryDirectory() as directory:
+            for engine in available_jit_engines():
+                path = os.path.join(directory, '{}.npz'.format(engine))
+                subprocess.run(
+                    [sys.executable, '-c', 'from tests.test_engines import run_kernels; '
+                     'run_kernels({!r}, {!r})'.format(engine, path)],
+                    cwd=ROOT, capture_output=True, check=True)
+                with np.load(path) as outputs:
+                    cls.outputs[engine] = dict(outputs)
+
+    def setUp(self):
+        if not self.outputs:
+            self.skipTest('Numba is not installed, nothing to compare with.')
+
+    def assert_close(self, *names: str, tolerance: float = TOLERANCE):
+        for name in names:
+            with self.subTest(kernel=name):
+                numba, numpy = self.outputs['numba'][name], self.outputs['numpy'][name]
+                self.assertLessEqual(np.abs(numba - numpy).max(), tolerance)
+
+    def test_gather_energy(self):
+        self.assert_close('energy', 'energy_parallel')
+
+    def test_gather_power(self):
+        self.assert_close('power', 'power_parallel')
+
+    def test_monstercat(self):
+        self.assert_close('monstercat', tolerance=TOLERANCE * HEIGHT)
+
+    def test_detect_onset(self):
+        self.assert_close('onset')
+        self.assertGreater(self.outputs['numpy']['onset'][:, 1].sum(), 0)
+
+    def test_rasterize_bars(self):
+        if 'raster' not in self.outputs['numpy']:
+            self.skipTest('Drawing needs cairo.')
+        for name in ['raster', 'raster_parallel']:
+            with self.subTest(kernel=name):
+                np.testing.assert_array_equal(self.outputs['numba'][name],
+                                              self.outputs['numpy'][name])
@@ -0,0 +1,84 @@
+import unittest
+
+from audioviz.governor import LEVELS, QualityGovernor
+
+
+PERIOD = 0.5
+HIGH, LOW, IDLE = 0.9, 0.6, 0.1
+
+
+class TestQualityGovernor(unittest.TestCase):
+    def setUp(self):
+        self.governor = QualityGovernor(high=0.8, low=0.4, down_delay=2., up_delay=10.)
+        self.now = 0.
+
+    def run_load(self, load: float, seconds: float) -> list[tuple[float, int]]:
+        """Samples the same load every period, returns times and levels of changes.
+        """
+        changes = []
+        for _ in range(round(seconds / PERIOD)):
+            self.now += PERIOD
+            if self.governor.update([load, None], self.now):
+                changes.append((self.now, self.governor.level))
+        return changes
+
+    def test_step_down_delay(self):
+        self.assertEqual(self.run_load(HIGH, 2.), [])
+        self.assertEqual(self.run_load(HIGH, 0.5), [(2.5, 1)])
+        # every step takes its own delay
+        self.assertEqual(self.run_load(HIGH, 2.), [(4.5, 2)])
+
+    def test_load_between_thresholds_holds_level(self):
+        self.run_load(HIGH, 2.5)
+        self.assertEqual(self.run_load(LOW, 60.), [])
+        self.assertEqual(self.governor.level, 1)
+
+    def test_lowest_level(self):
+        self.run_load(HIGH, 60.)
+        self.assertEqual(self.governor.level, len(LEVELS) - 1)
+
+    def test_step_up_delay(self):
+        self.run_load(HIGH, 2.5)
+        # delay starts with the first sample of low load at 3 s
+        self.assertEqual(self.run_load(IDLE, 10.), [])
+        self.assertEqual(self.run_load(IDLE, 0.5), [(13., 0)])
+        self.assertEqual(self.run_load(IDLE, 60.), [])
+
+    def test_nothing_measured(self):
+        self.run_load(HIGH, 1.5)
+        self.now += PERIOD
+        self.assertFalse(self.governor.update([None, None], self.now))
+        # pressure starts over
+        self.assertEqual(self.run_load(HIGH, 2.), [])
+        self.assertEqual(self.run_load(HIGH, 0.5), [(4.5, 1)])
+
+    def test_up_delay_backoff(self):
+        self.run_load(HIGH, 4.5)
+        self.assertEqual(self.run_load(IDLE, 10.5), [(15., 1)])
+        # step up is reverted soon, the next one waits twice as long
+        self.run_load(HIGH, 2.5)
+        self.assertEqual((self.governor.level, self.governor.up_delay), (2, 20.))
+        self.assertEqual(self.run_load(IDLE, 20.5), [(38., 1)])
+
+        for _ in range(3):
+            self.run_load(HIGH, 2.5)
+            self.run_load(IDLE, self.governor.up_delay + 0.5)
+        self.assertEqual(self.governor.up_delay, 120.)
+
+    def test_up_delay_reset(self):
+        self.run_load(HIGH, 4.5)
+        self.run_load(IDLE, 10.5)
+        self.run_load(HIGH, 2.5)
+        self.run_load(IDLE, 20.5)
+        self.assertEqual(self.governor.up_delay, 20.)
+
+        # the last step up held
+        self.assertEqual(self.run_load(IDLE, 20.), [(58., 0)])
+        self.assertEqual(self.governor.up_delay, 10.)
+
+    def test_reject(self):
+        self.run_load(HIGH, 2.5)
+        self.governor.reject(0)
+        self.assertEqual(self.governor.level, 0)
+        # rejected level is not tried again
+        self.assertEqual(self.run_load(HIGH, 10.), [])
@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import unittest
+from importlib.util import find_spec
+
+
+# modules only analysis and rendering need, audioviz.pypulse binds libpulse-simple
+HEAVY = ['gi', 'cairo', 'numpy', 'numba', 'audioviz.pypulse']
+REPORT = '''
+import json, os, sys
+maps = open('/proc/self/maps').read() if os.path.exists('/proc/self/maps') else ''
+print(json.dumps({'modules': sorted(sys.modules), 'libpulse': 'libpulse-simple' in maps}))
+'''
+# coarse budget of GUI cold start, it takes about a second on a slow machine
+GUI_BUDGET = 5.
+
+
+def run(code: str, **env: str) -> dict:
+    result = subprocess.run([sys.executable, '-c', code + REPORT],
+                            capture_output=True, text=True, env=dict(os.environ, **env),
+                            check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+class TestLightImport(unittest.TestCase):
+    def check_light(self, code: str):
+        loaded = run(code)
+        heavy = [name for name in loaded['modules']
+                 if name in HEAVY or name.split('.')[0] in HEAVY]
+        self.assertEqual(heavy, [])
+        self.assertFalse(loaded['libpulse'])
+
+    def test_default_config(self):
+        self.check_light("import sys; sys.argv = ['audioviz', '-d']\n"
+                         'from audioviz.cli.run import run; run()')
+
+    def test_cli(self):
+        self.check_light('import audioviz.cli.run')
+
+
+@unittest.skipIf(any(find_spec(name) is None for name in ['gi', 'cairo', 'pulsectl']),
+                 'GUI dependencies are not installed.')
+class TestGuiImport(unittest.TestCase):
+    def test_numpy_kernels(self):
+        # kernels are chosen by `jit = numpy` through environment, as `run` does
+        started = time.perf_counter()
+        loaded = run('import audioviz.render', AUDIOVIZ_JIT='numpy')
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual([name for name in loaded['modules'] if name.split('.')[0] == 'numba'],
+                         [])
+        self.assertLess(elapsed, GUI_BUDGET)
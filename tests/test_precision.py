@@ -0,0 +1,45 @@
+import unittest
+from importlib import resources
+
+import numpy as np
+
+from audioviz.analysis import Analyzer
+from audioviz.autotune import split_buffers, synthesize
+from audioviz.config import parse_config
+from audioviz.filter import available_fft_engines
+
+
+# bars are in 0..1 range, a thousandth of the bar height is invisible
+TOLERANCE = 1e-3
+SECONDS = 3
+
+
+def analyse(config: dict, buffers: np.ndarray) -> np.ndarray:
+    analyzer = Analyzer(config)
+    bars = np.empty((len(buffers), analyzer.bars))
+    for i, buffer in enumerate(buffers):
+        analyzer.process(buffer)
+        bars[i] = analyzer.band_mags
+    return bars
+
+
+class TestSinglePrecision(unittest.TestCase):
+    def setUp(self):
+        self.config = parse_config(resources.files('audioviz.cli').joinpath('data/config.cfg'))
+        self.config['analysis_rate'] = None
+        buffer_size = self.config['buffer_size']
+        audio = synthesize(self.config['frequency'], SECONDS * self.config['frequency'])
+        self.buffers = split_buffers(audio, buffer_size)
+
+    def test_bars_follow_double_precision(self):
+        for engine in available_fft_engines():
+            for scale in ['linear', 'db']:
+                with self.subTest(engine=engine, scale=scale):
+                    config = dict(self.config, fft_engine=engine, scale=scale)
+                    double_bars = analyse(dict(config, precision='double'), self.buffers)
+                    single_bars = analyse(dict(config, precision='single'), self.buffers)
+                    self.assertLess(np.abs(double_bars - single_bars).max(), TOLERANCE)
+
+
+if __name__ == '__main__':
+    unittest.main()
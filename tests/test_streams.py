@@ -0,0 +1,163 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from audioviz.config import validate_capture
+from audioviz.streams import SAMPLE_SIZE, TRACK_PERIOD, AppStreamsSource
+
+
+FREQUENCY = 44100
+BUFFER_SIZE = 512
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# records a tone of 440 Hz times sink input index in real time
+FAKE_PAREC = '''#!{}
+import math, sys, time
+from array import array
+args = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if '=' in arg)
+frequency = 440. * int(args['monitor-stream'])
+rate = int(args['rate'])
+chunk, position, started = 256, 0, time.perf_counter()
+while True:
+    samples = array('f', (0.5 * math.sin(2 * math.pi * frequency * (position + i) / rate)
+                          for i in range(chunk)))
+    sys.stdout.buffer.write(samples.tobytes())
+    sys.stdout.buffer.flush()
+    position += chunk
+    time.sleep(max(started + position / rate - time.perf_counter(), 0))
+'''.format(sys.executable)
+
+
+class FakeSinkInput:
+    def __init__(self, index: int, app: str):
+        self.index = index
+        self.proplist = {'application.name': app}
+
+
+class FakePulse:
+    """Sink inputs are taken from `inputs` list of (index, application) pairs.
+    """
+    inputs = []
+
+    def __init__(self, name: str):
+        pass
+
+    def sink_input_list(self) -> list[FakeSinkInput]:
+        return [FakeSinkInput(index, app) for index, app in self.inputs]
+
+    def close(self):
+        pass
+
+
+def magnitude_at(samples: np.ndarray, frequency: float) -> float:
+    mags = np.abs(np.fft.rfft(samples * np.hanning(samples.size)))
+    freqs = np.fft.rfftfreq(samples.size, 1 / FREQUENCY)
+    return mags[np.abs(freqs - frequency).argmin()] / mags.max()
+
+
+class TestAppStreams(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        parec = os.path.join(directory.name, 'parec')
+        with open(parec, 'w') as file:
+            file.write(FAKE_PAREC)
+        os.chmod(parec, 0o755)
+
+        path = os.pathsep.join([directory.name, os.environ.get('PATH', '')])
+        for patcher in [mock.patch.dict(os.environ, PATH=path),
+                        mock.patch.dict(sys.modules, pulsectl=types.SimpleNamespace(
+                            Pulse=FakePulse)),
+                        mock.patch.object(FakePulse, 'inputs', [])]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.source = AppStreamsSource({'apps': ['tone-a', 'tone-b'], 'frequency': FREQUENCY,
+                                        'channels': 1, 'buffer_size': BUFFER_SIZE})
+        self.buffer = np.zeros(BUFFER_SIZE, dtype=np.float32)
+
+    def tearDown(self):
+        if self.source.pulse is not None:
+            self.source.close()
+
+    def capture(self, seconds: float) -> np.ndarray:
+        frames = []
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            self.source.read(self.buffer)
+            frames.append(self.buffer.copy())
+        return np.concatenate(frames)
+
+    def test_open(self):
+        FakePulse.inputs[:] = [(1, 'tone-a'), (3, 'other')]
+        self.source.open()
+        self.assertEqual(list(self.source.streams), [1])
+        self.assertEqual(self.source.streams[1].app, 'tone-a')
+
+    def test_mix(self):
+        FakePulse.inputs[:] = [(1, 'tone-a'), (2, 'tone-b'), (3, 'other')]
+        self.source.open()
+        samples = self.capture(1.)
+        # every stream is mixed into the same buffers instead of taking turns
+        self.assertLess(samples.size, 1.2 * FREQUENCY)
+        samples = samples[-FREQUENCY // 2:]
+        # both listened tones are mixed, the other one is not captured
+        self.assertGreater(magnitude_at(samples, 440), 0.5)
+        self.assertGreater(magnitude_at(samples, 880), 0.5)
+        self.assertLess(magnitude_at(samples, 1320), 1e-2)
+
+    def test_teardown(self):
+        FakePulse.inputs[:] = [(1, 'tone-a'), (2, 'tone-b')]
+        self.source.open()
+        processes = [stream.process for stream in self.source.streams.values()]
+
+        FakePulse.inputs[:] = [(2, 'tone-b')]
+        self.capture(2 * TRACK_PERIOD)
+        self.assertEqual(list(self.source.streams), [2])
+        self.assertIsNotNone(processes[0].poll())
+
+        self.source.close()
+        self.assertEqual(self.source.streams, {})
+        self.assertIsNotNone(processes[1].poll())
+
+    def test_queue_limit(self):
+        FakePulse.inputs[:] = [(1, 'tone-a')]
+        self.source.open()
+        # about five times as many samples as a stream may queue
+        time.sleep(10 * self.source.queue_limit / SAMPLE_SIZE / FREQUENCY)
+        self.source.fill()
+        queue = self.source.streams[1].queue
+        self.assertLessEqual(len(queue), self.source.queue_limit)
+        self.assertEqual(len(queue) % SAMPLE_SIZE, 0)
+
+    def test_silence_without_streams(self):
+        self.source.open()
+        started = time.perf_counter()
+        self.buffer.fill(1)
+        self.source.read(self.buffer)
+        self.assertLess(time.perf_counter() - started, TRACK_PERIOD / 2)
+        self.assertFalse(self.buffer.any())
+
+    def test_missing_parec(self):
+        with mock.patch.dict(os.environ, PATH=tempfile.gettempdir()):
+            with self.assertRaises(ValueError):
+                validate_capture('apps', ['tone-a'])
+
+
+@unittest.skipIf(any(shutil.which(utility) is None for utility in ['pactl', 'paplay', 'parec']),
+                 'PulseAudio utilities are not installed.')
+class TestPulseDaemon(unittest.TestCase):
+    def test_app_streams(self):
+        if subprocess.run(['pactl', 'info'], capture_output=True).returncode:
+            self.skipTest('PulseAudio daemon is not running.')
+
+        result = subprocess.run([sys.executable, 'benchmarks/check_app_streams.py'],
+                                cwd=ROOT, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)